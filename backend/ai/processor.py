@@ -1,15 +1,24 @@
 import os
 import json
-from openai import OpenAI
-from typing import List
+from typing import Callable, Iterable, List, Optional
 
-# Initialize client
+from pdf_tools.linebreak import break_lines
+
+# The OpenAI client is created on first use; importing openai costs more than
+# the rest of the API put together and offline deployments never need it.
 # Ensure OPENAI_API_KEY is set in environment
-try:
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-except Exception as e:
-    print(f"Warning: OpenAI client init failed: {e}")
-    client = None
+_client = None
+
+def get_client() -> Optional["OpenAI"]:
+    """Returns the shared OpenAI client, or None if there is no key or init fails."""
+    global _client
+    if _client is None and os.environ.get("OPENAI_API_KEY"):
+        try:
+            from openai import OpenAI
+            _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        except Exception as e:
+            print(f"Warning: OpenAI client init failed: {e}")
+    return _client
 
 SYSTEM_PROMPT = """You are a text formatter. Take raw PDF text and output a JSON object with a key "lines" containing a list of clean lines (35–55 chars each).
 Keep math equations, bullets, headings, and definitions.
@@ -27,16 +36,25 @@ Output JSON format:
 }
 """
 
-def preprocess_text(text: str) -> List[str]:
+def preprocess_text(text: str, char_width: Optional[Callable[[str], float]] = None,
+                    max_width: float = 50) -> Iterable[str]:
     """
     Uses OpenAI to clean text and split it into handwriting-ready lines.
+
+    Without AI the text is wrapped locally to `max_width`, measured with
+    `char_width` (one unit per character by default). That fallback is a
+    generator, so lines are produced while the caller paginates them.
     """
     if not text or not text.strip():
         return []
 
-    if not client or not os.environ.get("OPENAI_API_KEY"):
+    def fallback():
+        return break_lines(text, max_width, char_width)
+
+    client = get_client()
+    if not client:
         print("Warning: No OpenAI API Key found. Using simple fallback.")
-        return simple_chunk_text(text)
+        return fallback()
 
     try:
         response = client.chat.completions.create(
@@ -55,27 +73,12 @@ def preprocess_text(text: str) -> List[str]:
         if "lines" in data:
             return data["lines"]
         else:
-            return simple_chunk_text(text)
+            return fallback()
 
     except Exception as e:
         print(f"AI Preprocessing failed: {e}")
-        return simple_chunk_text(text)
+        return fallback()
 
 def simple_chunk_text(text: str, chunk_size=50) -> List[str]:
-    """Fallback if OpenAI fails or no key"""
-    lines = []
-    # Basic paragraph splitting
-    paragraphs = text.replace('\r', '').split('\n')
-    for p in paragraphs:
-        if not p.strip():
-            continue
-        # Split long lines
-        while len(p) > chunk_size:
-            # Find last space within chunk_size
-            split_idx = p[:chunk_size].rfind(' ')
-            if split_idx == -1: split_idx = chunk_size
-            lines.append(p[:split_idx])
-            p = p[split_idx:].strip()
-        if p:
-            lines.append(p)
-    return lines
+    """Fallback if OpenAI fails or no key: paragraph-aware wrapping to `chunk_size` characters."""
+    return list(break_lines(text, chunk_size))
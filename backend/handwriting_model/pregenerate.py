@@ -0,0 +1,49 @@
+"""
+Pre-generates handwriting strokes for a word or line list into a stroke store.
+
+    cd backend
+    python -m handwriting_model.pregenerate words.txt words.strokes --samples 3 --bias 0.8
+
+The input has one word or line per entry; blank lines and duplicates are
+skipped. Serving processes open the result with StrokeStore instead of
+running the model per request.
+"""
+import argparse
+import time
+
+from handwriting_model.stroke_store import write_stroke_store
+
+def read_keys(path: str):
+    with open(path, encoding="utf-8") as f:
+        keys = {line.strip() for line in f}
+    keys.discard("")
+    # The store needs keys in bytewise order; generating in that order lets points stream to disk
+    return sorted(keys, key=lambda k: k.encode("utf-8"))
+
+def generate(model, keys, samples: int, bias: float):
+    start = time.perf_counter()
+    for n, key in enumerate(keys, start=1):
+        yield key, [model.generate_strokes(key, bias=bias) for _ in range(samples)]
+        if n % 100 == 0 or n == len(keys):
+            elapsed = time.perf_counter() - start
+            print(f"  {n}/{len(keys)} entries, {n / elapsed:.1f}/sec")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate handwriting strokes into a memory-mapped store.")
+    parser.add_argument("input", help="text file with one word or line per line")
+    parser.add_argument("output", help="stroke store to write")
+    parser.add_argument("--samples", type=int, default=1, help="independently generated versions per entry")
+    parser.add_argument("--bias", type=float, default=1.0, help="neatness, as in HandwritingModel.generate_strokes")
+    parser.add_argument("--checkpoint", default=None, help="model checkpoint directory")
+    args = parser.parse_args(argv)
+
+    keys = read_keys(args.input)
+    print(f"Generating {args.samples} sample(s) for {len(keys)} entries...")
+
+    from handwriting_model.wrapper import HandwritingModel
+    model = HandwritingModel(args.checkpoint)
+    count = write_stroke_store(args.output, generate(model, keys, args.samples, args.bias), bias=args.bias)
+    print(f"Wrote {count} entries to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import bisect
+import os
+import random
+from array import array
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# File layout (little-endian, sections 8-byte aligned):
+#   header                   HEADER_DTYPE
+#   points                   float32[points, 2]  all coordinates, stroke after stroke
+#   stroke_points            uint64[strokes + 1] point range of each stroke
+#   sample_strokes           uint64[samples + 1] stroke range of each sample
+#   entry_samples            uint64[entries + 1] sample range of each key
+#   key_offsets              uint64[entries + 1] byte range of each key in the key blob
+#   keys                     UTF-8 keys, sorted bytewise, concatenated
+# A key (word or line) can have several samples, i.e. independently generated versions.
+MAGIC = b"INKSTRK1"
+VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("bias", "<f4"),
+    ("entries", "<u8"), ("samples", "<u8"), ("strokes", "<u8"), ("points", "<u8"), ("key_bytes", "<u8"),
+    ("points_at", "<u8"), ("stroke_points_at", "<u8"), ("sample_strokes_at", "<u8"),
+    ("entry_samples_at", "<u8"), ("key_offsets_at", "<u8"), ("keys_at", "<u8"),
+])
+
+Stroke = Sequence[Tuple[float, float]]
+
+def _pad(f) -> int:
+    """Pads the file to an 8-byte boundary and returns the new position."""
+    pos = f.tell()
+    if pos % 8:
+        f.write(b"\0" * (8 - pos % 8))
+    return f.tell()
+
+def write_stroke_store(path: str, entries: Iterable[Tuple[str, List[List[Stroke]]]], bias: float = 1.0) -> int:
+    """
+    Writes (key, samples) pairs to a stroke store, where each sample is a list
+    of strokes and each stroke a sequence of (x, y) points or an (n, 2) array.
+    Keys must arrive sorted by their UTF-8 bytes and be unique. Points are
+    streamed to disk as they come, so only the offset tables are kept in memory.
+    The file is written beside `path` and renamed into place once complete, so
+    processes that have the old store mapped keep reading it, never a
+    truncated one. Returns the number of entries written.
+    """
+    keys = []
+    stroke_points = array("Q", [0])
+    sample_strokes = array("Q", [0])
+    entry_samples = array("Q", [0])
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(header.tobytes()) # placeholder, rewritten once the counts are known
+            points_at = _pad(f)
+            previous = None
+            for key, samples in entries:
+                encoded = key.encode("utf-8")
+                if previous is not None and encoded <= previous:
+                    raise ValueError(f"Keys must be unique and sorted bytewise, got {key!r} after {previous.decode('utf-8')!r}")
+                previous = encoded
+                keys.append(encoded)
+
+                for strokes in samples:
+                    for stroke in strokes:
+                        points = np.asarray(stroke, dtype="<f4").reshape(-1, 2)
+                        f.write(points.tobytes())
+                        stroke_points.append(stroke_points[-1] + len(points))
+                    sample_strokes.append(len(stroke_points) - 1)
+                entry_samples.append(len(sample_strokes) - 1)
+
+            offsets = {}
+            for name, table in (("stroke_points_at", stroke_points), ("sample_strokes_at", sample_strokes),
+                                ("entry_samples_at", entry_samples)):
+                offsets[name] = _pad(f)
+                f.write(np.frombuffer(table, dtype=np.uint64).astype("<u8").tobytes())
+
+            key_offsets = np.zeros(len(keys) + 1, dtype="<u8")
+            np.cumsum([len(k) for k in keys], out=key_offsets[1:])
+            offsets["key_offsets_at"] = _pad(f)
+            f.write(key_offsets.tobytes())
+            offsets["keys_at"] = f.tell()
+            f.write(b"".join(keys))
+
+            header[0] = (MAGIC, VERSION, bias, len(keys), len(sample_strokes) - 1, len(stroke_points) - 1,
+                         stroke_points[-1], int(key_offsets[-1]), points_at, offsets["stroke_points_at"],
+                         offsets["sample_strokes_at"], offsets["entry_samples_at"], offsets["key_offsets_at"],
+                         offsets["keys_at"])
+            f.seek(0)
+            f.write(header.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return len(keys)
+
+class _SortedKeys:
+    """Sequence view of the key blob for bisect; decodes nothing and builds no index."""
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        start, end = self.offsets[i:i + 2].tolist()
+        return self.blob[start:end].tobytes()
+
+class StrokeStore:
+    """
+    Read-only, memory-mapped stroke store written by write_stroke_store (see
+    handwriting_model.pregenerate). The file is mapped rather than loaded, so
+    worker processes opening the same store share its pages through the OS
+    page cache. Lookups are a binary search over the sorted keys, and strokes
+    come back as (n, 2) float32 views into the mapping, not copies.
+    """
+    WORD_GAP = 0.4 # space between words looked up separately, relative to their height
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        # Plain ndarray views of the mapping: same pages, cheaper to slice than memmap objects
+        self._buffer = self._map.view(np.ndarray)
+        header = self._buffer[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} stroke store")
+
+        self.bias = float(header["bias"])
+        self.points = self._section(header["points_at"], "<f4", int(header["points"]) * 2).reshape(-1, 2)
+        self.stroke_points = self._section(header["stroke_points_at"], "<u8", int(header["strokes"]) + 1)
+        self.sample_strokes = self._section(header["sample_strokes_at"], "<u8", int(header["samples"]) + 1)
+        self.entry_samples = self._section(header["entry_samples_at"], "<u8", int(header["entries"]) + 1)
+        key_offsets = self._section(header["key_offsets_at"], "<u8", int(header["entries"]) + 1)
+        self._keys = _SortedKeys(key_offsets, self._section(header["keys_at"], np.uint8, int(header["key_bytes"])))
+
+    def _section(self, offset, dtype, count: int) -> np.ndarray:
+        start = int(offset)
+        return self._buffer[start:start + count * np.dtype(dtype).itemsize].view(dtype)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) is not None
+
+    def _find(self, key: str) -> Optional[int]:
+        encoded = key.encode("utf-8")
+        i = bisect.bisect_left(self._keys, encoded)
+        if i < len(self._keys) and self._keys[i] == encoded:
+            return i
+        return None
+
+    def samples(self, key: str) -> List[List[np.ndarray]]:
+        """Every stored sample of `key`, each a list of (n, 2) float32 stroke views; [] if absent."""
+        i = self._find(key)
+        if i is None:
+            return []
+        return [self._strokes(s) for s in range(int(self.entry_samples[i]), int(self.entry_samples[i + 1]))]
+
+    def get(self, key: str, variant: Optional[int] = None) -> Optional[List[np.ndarray]]:
+        """One sample of `key` (a random one unless `variant` is given), or None if absent."""
+        i = self._find(key)
+        if i is None:
+            return None
+        first, end = int(self.entry_samples[i]), int(self.entry_samples[i + 1])
+        if first == end:
+            return []
+        sample = first + (variant % (end - first) if variant is not None else random.randrange(end - first))
+        return self._strokes(sample)
+
+    def line_strokes(self, line: str, variant: Optional[int] = None) -> Optional[List[np.ndarray]]:
+        """
+        Strokes for a line of text, ready for StrokeRenderer: the stored line
+        itself if there is one, else one sample per word, placed left to right
+        with a word gap of WORD_GAP times the tallest word. None if any word is
+        missing, so the caller can fall back to the model.
+        """
+        whole = self.get(line, variant)
+        if whole is not None:
+            return whole
+
+        words = []
+        for word in line.split():
+            strokes = self.get(word, variant)
+            if strokes is None:
+                return None
+            words.append([stroke for stroke in strokes if len(stroke)])
+        words = [strokes for strokes in words if strokes]
+        if not words:
+            return []
+
+        extents = [(min(float(s[:, 0].min()) for s in strokes), max(float(s[:, 0].max()) for s in strokes),
+                    max(float(s[:, 1].max()) for s in strokes) - min(float(s[:, 1].min()) for s in strokes))
+                   for strokes in words]
+        gap = self.WORD_GAP * max(height for _, _, height in extents)
+        placed = []
+        x = 0.0
+        for strokes, (left, right, _) in zip(words, extents):
+            shift = np.array([x - left, 0.0], dtype=np.float32)
+            placed.extend(stroke + shift for stroke in strokes)
+            x += right - left + gap
+        return placed
+
+    def _strokes(self, sample: int) -> List[np.ndarray]:
+        bounds = self.stroke_points[int(self.sample_strokes[sample]):int(self.sample_strokes[sample + 1]) + 1].tolist()
+        return [self.points[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+@lru_cache(maxsize=1)
+def get_stroke_store() -> Optional[StrokeStore]:
+    """Process-wide store from INKNOTES_STROKE_STORE, or None if not configured."""
+    path = os.environ.get("INKNOTES_STROKE_STORE")
+    return StrokeStore(path) if path else None
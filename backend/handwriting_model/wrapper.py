@@ -1,18 +1,20 @@
 import sys
 import os
-import torch
 import numpy as np
+from functools import lru_cache
 
 # Add repo to sys.path so we can import modules from it
 REPO_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "repo"))
 if REPO_PATH not in sys.path:
     sys.path.append(REPO_PATH)
 
-from handwriting_synthesis.sampling import HandwritingSynthesizer
-from handwriting_synthesis import utils
-
 class HandwritingModel:
     def __init__(self, checkpoint_path=None):
+        # torch and the synthesis repo are imported here, not at module import,
+        # so code that only references this module stays cheap to load
+        import torch
+        from handwriting_synthesis.sampling import HandwritingSynthesizer
+        
         self.device = torch.device("cpu")
         if checkpoint_path is None:
              # Default to checkpoint 56 if available, otherwise find latest
@@ -86,3 +88,8 @@ class HandwritingModel:
             strokes.append(current_stroke)
             
         return strokes
+
+@lru_cache(maxsize=1)
+def get_handwriting_model():
+    """Process-wide model instance, loaded on first use (or by the startup warm-up)."""
+    return HandwritingModel()
@@ -1,22 +1,56 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
+import asyncio
+import json
 import os
 import uuid
 import shutil
+import zipfile
+import zlib
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import List, Optional
 
 # Import our modules
 import sys
-# Add backend directory to sys.path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Make the backend packages importable when started from the repo root
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
 
-from pdf_tools.extractor import extract_text, split_text_into_chunks
 # from handwriting_model.wrapper import HandwritingModel # Removed
 # from renderer.stroke_renderer import StrokeRenderer # Removed
-from pdf_tools.builder import create_pdf_from_images
+from pipeline.batch import Batch, BatchTooLarge, copy_limited, merge_batch_pdf, start_batch
+from pipeline.convert import OUTPUT_MODES, build_job_pdf, job_renderer, mask_path, page_prefix, submit_pdf_job
+from pipeline.profiles import OUTPUT_PROFILES, profile_path, write_page_profiles
+from pipeline.scheduler import QueueFull, Scheduler
+from pipeline import warmup
+from renderer.font_renderer import FONT_SIZE_RANGE, LINE_SPACING_RANGE
 
-app = FastAPI(title="InkNotes API")
+# Heavy deps (openai, pdfplumber, pytesseract, torch) are never imported at module
+# load; INKNOTES_STARTUP picks when they are (see pipeline.warmup.STARTUP_MODES).
+STARTUP_MODE = os.environ.get("INKNOTES_STARTUP", "background")
+PRELOAD_MODEL = os.environ.get("INKNOTES_PRELOAD_MODEL", "0") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start_warmup(STARTUP_MODE, preload_model=PRELOAD_MODEL)
+    yield
+
+app = FastAPI(title="InkNotes API", lifespan=lifespan)
+
+# Preview lane on reserved workers, bulk lane shared fairly between users
+scheduler = Scheduler.from_env()
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request: Request, exc: QueueFull):
+    return JSONResponse(status_code=429, headers={"Retry-After": str(exc.retry_after)},
+                        content={"error": str(exc), "retry_after": exc.retry_after})
+
+def user_key(request: Request, x_user_id: Optional[str]) -> str:
+    """Fairness key for the bulk lane: the X-User-Id header, else the client address."""
+    return x_user_id or (request.client.host if request.client else "anonymous")
 
 # CORS setup for local development
 app.add_middleware(
@@ -30,6 +64,9 @@ app.add_middleware(
 # Directories
 UPLOAD_DIR = "uploads"
 OUTPUT_DIR = "outputs"
+# Limits for one /batch request, counted after unzipping
+MAX_BATCH_FILES = int(os.environ.get("INKNOTES_BATCH_MAX_FILES", 200))
+MAX_BATCH_BYTES = int(os.environ.get("INKNOTES_BATCH_MAX_MB", 500)) * 1024 * 1024
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -39,150 +76,292 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # Job status store (in-memory for MVP)
 jobs = {}
+# Batch store; each file of a batch is also an entry in `jobs`
+batches = {}
 
 @app.get("/")
 async def root():
     return {"message": "InkNotes API is running"}
 
-from pydantic import BaseModel
+@app.get("/scheduler")
+async def scheduler_stats():
+    return scheduler.stats()
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    return JSONResponse(status_code=200 if warmup.state.ready else 503, content=warmup.state.as_dict())
+
+from pydantic import BaseModel, Field
 from fastapi.responses import Response
 
 class GenerateRequest(BaseModel):
     text: str
     font_style: str = "default"
     ink_color: str = "blue"
-    font_size: int = 28
-    line_spacing: int = 40
+    font_size: int = Field(28, ge=FONT_SIZE_RANGE[0], le=FONT_SIZE_RANGE[1])
+    line_spacing: int = Field(40, ge=LINE_SPACING_RANGE[0], le=LINE_SPACING_RANGE[1])
     paper_type: str = "blank"
 
+from pipeline.preview import PreviewManager, DRAFT_SCALE
+
+# Shared by all preview endpoints: debouncing, per-session cancellation, mask cache
+preview_manager = PreviewManager(scheduler)
+
 @app.post("/generate-preview")
 async def generate_preview(req: GenerateRequest):
-    from renderer.font_renderer import FontRenderer
-    import io
-    
-    # Initialize renderer with custom params
-    renderer = FontRenderer(
-        background_type=req.paper_type,
-        font_size=req.font_size,
-        line_spacing=req.line_spacing,
-        ink_color=req.ink_color
-    )
+    img_bytes = await asyncio.wrap_future(scheduler.submit_preview(preview_manager.render_png, req))
+    return Response(content=img_bytes, media_type="image/png")
+
+@app.post("/preview/{session_id}")
+async def session_preview(session_id: str, req: GenerateRequest, draft: bool = False):
+    """
+    Keyed preview: a newer request for the same session cancels this one, which
+    then answers 409. Pass draft=true for a fast reduced-resolution image.
+    """
+    img_bytes = await preview_manager.render(session_id, req, scale=DRAFT_SCALE if draft else 1.0)
+    if img_bytes is None:
+        return JSONResponse(status_code=409, content={"error": "Superseded by a newer preview request"})
+    return Response(content=img_bytes, media_type="image/png")
+
+@app.websocket("/ws/preview/{session_id}")
+async def preview_socket(websocket: WebSocket, session_id: str):
+    """
+    Streaming preview: each JSON GenerateRequest received cancels the previous
+    one and is answered with a draft PNG, then the full PNG. Every image is
+    immediately preceded by a JSON header {"quality": "draft" | "full"}. A
+    malformed request is answered with {"error": ...} and the socket stays open.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    streams = set()
     
-    # Render to temp file (renderer currently saves to file)
-    # Optimization: Refactor renderer to return BytesIO, but for now use temp
-    tmp_path = f"{OUTPUT_DIR}/preview_{uuid.uuid4()}.png"
-    renderer.render_text(req.text, tmp_path, style=req.font_style)
+    async def send(quality: str, png: bytes):
+        # A header and its image always go out back to back
+        async with send_lock:
+            await websocket.send_json({"quality": quality})
+            await websocket.send_bytes(png)
     
-    with open(tmp_path, "rb") as f:
-        img_bytes = f.read()
+    async def stream(req: GenerateRequest):
+        try:
+            await preview_manager.stream(session_id, req, send)
+        except QueueFull as e:
+            async with send_lock:
+                await websocket.send_json({"error": str(e), "retry_after": e.retry_after})
     
-    # Cleanup
-    os.remove(tmp_path)
+    def stream_done(task: asyncio.Task):
+        streams.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Preview {session_id}: stream failed: {task.exception()!r}")
     
-    return Response(content=img_bytes, media_type="image/png")
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                req = GenerateRequest(**json.loads(message))
+            except (TypeError, ValueError) as e: # not JSON, not an object, or a pydantic ValidationError
+                async with send_lock:
+                    await websocket.send_json({"error": f"Invalid preview request: {e}"})
+                continue
+            task = asyncio.create_task(stream(req))
+            streams.add(task)
+            task.add_done_callback(stream_done)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        preview_manager.close(session_id)
+        for task in streams:
+            task.cancel()
 
 @app.post("/upload")
 async def upload_pdf(
-    background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
     style: str = "default",
     color: str = "blue",
     paper: str = "blank",
-    size: int = 28
+    size: int = Query(28, ge=FONT_SIZE_RANGE[0], le=FONT_SIZE_RANGE[1]),
+    output: str = "raster",
+    x_user_id: Optional[str] = Header(None)
 ):
+    if output not in OUTPUT_MODES:
+        return JSONResponse(status_code=400, content={"error": f"output must be one of {list(OUTPUT_MODES)}"})
+    user = user_key(request, x_user_id)
+    scheduler.admit_bulk(user)
+    
     job_id = str(uuid.uuid4())
     file_location = f"{UPLOAD_DIR}/{job_id}.pdf"
     
-    with open(file_location, "wb+") as file_object:
-        shutil.copyfileobj(file.file, file_object)
+    try:
+        with open(file_location, "wb+") as file_object:
+            shutil.copyfileobj(file.file, file_object)
+    except BaseException:
+        scheduler.release_bulk(user)
+        raise
     
     jobs[job_id] = {"status": "queued", "progress": 0}
     
-    background_tasks.add_task(process_pdf_task, job_id, file_location, style, color, paper, size)
+    future = submit_pdf_job(scheduler, user, jobs[job_id], job_id, file_location,
+                            OUTPUT_DIR, style, color, paper, size, output)
+    future.add_done_callback(lambda _: scheduler.release_bulk(user))
     
     return {"job_id": job_id, "status": "queued"}
 
-def process_pdf_task(job_id: str, file_path: str, style: str, color: str, paper: str, size: int):
-    from renderer.font_renderer import FontRenderer
+@app.post("/batch")
+def upload_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    style: str = "default",
+    color: str = "blue",
+    paper: str = "blank",
+    size: int = Query(28, ge=FONT_SIZE_RANGE[0], le=FONT_SIZE_RANGE[1]),
+    merge: bool = False,
+    output: str = "raster",
+    x_user_id: Optional[str] = Header(None)
+):
+    """
+    Converts many PDFs in one request. Each upload may be a PDF or a zip of
+    PDFs. With merge=true the result is one PDF, otherwise one per file.
+    A plain def: copying and unzipping block, so FastAPI runs it in its threadpool.
+    """
+    if output not in OUTPUT_MODES:
+        return JSONResponse(status_code=400, content={"error": f"output must be one of {list(OUTPUT_MODES)}"})
+    user = user_key(request, x_user_id)
+    
+    batch_id = str(uuid.uuid4())
+    batch_files = []
+    budget = [MAX_BATCH_BYTES]
+    
+    def add_file(name: str, src):
+        if len(batch_files) >= MAX_BATCH_FILES:
+            raise BatchTooLarge(f"more than {MAX_BATCH_FILES} PDF files")
+        job_id = str(uuid.uuid4())
+        batch_files.append((job_id, name))
+        with open(f"{UPLOAD_DIR}/{job_id}.pdf", "wb+") as file_object:
+            budget[0] -= copy_limited(src, file_object, budget[0])
+        jobs[job_id] = {"status": "queued", "progress": 0}
     
+    def discard():
+        for job_id, _ in batch_files:
+            jobs.pop(job_id, None)
+            if os.path.exists(f"{UPLOAD_DIR}/{job_id}.pdf"):
+                os.remove(f"{UPLOAD_DIR}/{job_id}.pdf")
+    
+    upload = None
     try:
-        jobs[job_id] = {"status": "processing", "progress": 10}
-        
-        # 1. Extract Text
-        print(f"Job {job_id}: Extracting text...")
-        text = extract_text(file_path)
-        if not text:
-            jobs[job_id] = {"status": "failed", "error": "Could not extract text from PDF"}
-            return
-        
-        jobs[job_id]["progress"] = 30
-        
-        jobs[job_id]["progress"] = 30
-        
-        # 2. Split into pages (Smart AI Processing)
-        # Use OpenAI to format text into lines, then chunk into pages
-        from ai.processor import preprocess_text
-        
-        print(f"Job {job_id}: AI Preprocessing...")
-        # Get list of clean lines
-        lines = preprocess_text(text)
-        
-        # Group lines into pages (approx 25 lines per page)
-        lines_per_page = 25
-        page_texts = []
-        current_page = []
-        
-        for line in lines:
-            current_page.append(line)
-            if len(current_page) >= lines_per_page:
-                page_texts.append("\n".join(current_page))
-                current_page = []
-        
-        if current_page:
-            page_texts.append("\n".join(current_page))
-            
-        chunks = page_texts if page_texts else [" "]
-        
-        # 3. Render Pages
-        print(f"Job {job_id}: Rendering pages...")
-        # Use user params
-        renderer = FontRenderer(
-            background_type=paper,
-            font_size=size,
-            line_spacing=int(size * 1.5), # Auto-calc spacing
-            ink_color=color
-        )
-        
-        page_images = []
-        total_chunks = len(chunks)
-        
-        for i, chunk in enumerate(chunks):
-            page_output_path = f"{OUTPUT_DIR}/{job_id}_page_{i}.png"
-            
-            renderer.render_text(chunk, page_output_path, style=style, color_override=color)
-            page_images.append(page_output_path)
-            
-            # Update progress
-            jobs[job_id]["progress"] = 30 + int(60 * (i+1) / total_chunks)
-
-        # 4. Create PDF
-        print(f"Job {job_id}: Creating PDF...")
-        final_pdf_path = f"{OUTPUT_DIR}/{job_id}.pdf"
-        create_pdf_from_images(page_images, final_pdf_path)
+        for upload in files:
+            if (upload.filename or "").lower().endswith(".zip"):
+                with zipfile.ZipFile(upload.file) as archive:
+                    members = sorted(m for m in archive.namelist()
+                                     if m.lower().endswith(".pdf") and not m.startswith("__MACOSX/"))
+                    if len(batch_files) + len(members) > MAX_BATCH_FILES:
+                        raise BatchTooLarge(f"more than {MAX_BATCH_FILES} PDF files")
+                    for member in members:
+                        with archive.open(member) as src:
+                            add_file(member, src)
+            else:
+                add_file(upload.filename, upload.file)
+    except BaseException as e:
+        discard() # nothing of a rejected batch is kept
+        if isinstance(e, BatchTooLarge):
+            limits = f"{MAX_BATCH_FILES} files, {MAX_BATCH_BYTES // (1024 * 1024)} MB"
+            return JSONResponse(status_code=413, content={"error": f"Batch too large ({limits}): {e}"})
+        # Corrupt, encrypted or unsupported archives: BadZipFile, RuntimeError, NotImplementedError, zlib.error
+        if isinstance(e, (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error, EOFError)):
+            return JSONResponse(status_code=400, content={"error": f"Could not read {upload.filename}: {e}"})
+        raise
+    
+    if not batch_files:
+        return JSONResponse(status_code=400, content={"error": "No PDF files in upload"})
+    
+    # Admission counts files, so it waits until the archives are unpacked
+    try:
+        scheduler.admit_bulk(user, len(batch_files))
+    except QueueFull:
+        discard()
+        raise
+    
+    batch = Batch(batch_id, batch_files, merge=merge)
+    batches[batch_id] = batch
+    for future in start_batch(batch, scheduler, user, jobs, UPLOAD_DIR, OUTPUT_DIR,
+                              style, color, paper, size, output):
+        future.add_done_callback(lambda _: scheduler.release_bulk(user))
+    
+    return batch.as_dict(jobs)
+
+@app.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    if batch_id not in batches:
+        return {"error": "Batch not found"}
+    return batches[batch_id].as_dict(jobs)
+
+@app.get("/batch/{batch_id}/download")
+async def download_batch(batch_id: str):
+    file_path = f"{OUTPUT_DIR}/{batch_id}.pdf"
+    if batch_id in batches and os.path.exists(file_path):
+        return FileResponse(file_path, media_type='application/pdf', filename="InkNotes_Batch_Export.pdf")
+    return {"error": "File not found"}
+
+@app.post("/recolor/{job_id}")
+async def recolor_job(job_id: str, request: Request, color: Optional[str] = None, paper: Optional[str] = None,
+                      x_user_id: Optional[str] = Header(None)):
+    """Changes ink and/or paper of a finished job; whichever is not given is kept."""
+    job = jobs.get(job_id)
+    if not job or job.get("status") != "completed":
+        return {"error": "Job not found or not completed"}
+    
+    user = user_key(request, x_user_id)
+    scheduler.admit_bulk(user)
+    job["status"] = "recoloring"
+    future = scheduler.submit_bulk(user, recolor_pdf_task, job_id, color or job["color"], paper or job["paper"])
+    future.add_done_callback(lambda _: scheduler.release_bulk(user))
+    return {"job_id": job_id, "status": "recoloring"}
+
+def recolor_pdf_task(job_id: str, color: str, paper: str):
+    """Rebuilds a finished job's pages and PDF from its stored ink masks or layouts with a new ink/paper."""
+    from PIL import Image
+    
+    job = jobs[job_id]
+    try:
+        job.update(color=color, paper=paper)
+        # Vector jobs have no page images; their PDF is re-written from the stored layouts
+        if job.get("output") != "vector":
+            renderer = job_renderer(job["font_size"])
+            for i in range(job["pages"]):
+                with Image.open(mask_path(OUTPUT_DIR, job_id, i)) as mask:
+                    write_page_profiles(renderer.colorize(mask, color, paper), page_prefix(OUTPUT_DIR, job_id, i))
         
-        jobs[job_id] = {"status": "completed", "progress": 100, "result_url": f"/download/{job_id}"}
+        build_job_pdf(OUTPUT_DIR, [(job_id, job)], f"{OUTPUT_DIR}/{job_id}.pdf")
+        job["result_url"] = f"/download/{job_id}"
         
+        # A file of a merged batch is also part of the batch PDF
+        batch = next((b for b in batches.values() if b.merge and any(j == job_id for j, _ in b.files)), None)
+        if batch is not None and batch.result_url:
+            try:
+                merge_batch_pdf(batch, jobs, OUTPUT_DIR)
+            except Exception as e:
+                print(f"Batch {batch.batch_id}: merge after recolor failed: {e}")
+                batch.error = str(e)
+        job["status"] = "completed"
     except Exception as e:
-        print(f"Job {job_id} failed: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Job {job_id} recolor failed: {e}")
         jobs[job_id] = {"status": "failed", "error": str(e)}
+
 @app.get("/status/{job_id}")
 async def get_status(job_id: str):
     if job_id not in jobs:
         return {"error": "Job not found"}
     return jobs[job_id]
 
+@app.get("/pages/{job_id}/{profile}/{page}")
+async def get_page_image(job_id: str, profile: str, page: int):
+    if profile not in OUTPUT_PROFILES:
+        return {"error": f"Unknown profile, expected one of {list(OUTPUT_PROFILES)}"}
+    file_path = profile_path(page_prefix(OUTPUT_DIR, job_id, page), profile)
+    if os.path.exists(file_path):
+        return FileResponse(file_path, media_type=f"image/{OUTPUT_PROFILES[profile]['format'].lower()}")
+    return {"error": "File not found"}
+
 @app.get("/download/{job_id}")
 async def download_pdf(job_id: str):
     file_path = f"{OUTPUT_DIR}/{job_id}.pdf"
@@ -28,3 +28,33 @@ def create_pdf_from_images(image_paths, output_pdf_path):
     if first_image:
         first_image.save(output_pdf_path, save_all=True, append_images=images)
         print(f"PDF saved to {output_pdf_path}")
+
+def create_pdf_from_jpegs(image_paths, output_pdf_path, dpi=300):
+    """
+    Combines JPEG page images into a single PDF without re-encoding them.
+    
+    Unlike create_pdf_from_images, the JPEG streams are embedded as-is
+    (DCTDecode), pages are sized from the image and its dpi, and only one
+    page is held in memory at a time.
+    
+    Args:
+        image_paths (list): List of paths to JPEG files.
+        output_pdf_path (str): Path to save the final PDF.
+        dpi (int): Resolution the pages were rendered at.
+    """
+    if not image_paths:
+        return
+    
+    from reportlab.pdfgen import canvas
+    
+    pdf = canvas.Canvas(output_pdf_path, pageCompression=1)
+    for path in image_paths:
+        with Image.open(path) as img:
+            width_px, height_px = img.size
+        # PDF user space is 72 units per inch
+        page_size = (width_px * 72.0 / dpi, height_px * 72.0 / dpi)
+        pdf.setPageSize(page_size)
+        pdf.drawImage(path, 0, 0, width=page_size[0], height=page_size[1])
+        pdf.showPage()
+    pdf.save()
+    print(f"PDF saved to {output_pdf_path}")
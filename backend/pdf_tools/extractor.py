@@ -1,62 +1,88 @@
-import pdfplumber
-import pytesseract
-
-try:
-    from pdf2image import convert_from_path
-except ImportError:
-    convert_from_path = None
 import os
 
-def extract_text(pdf_path):
+# pdfplumber, pytesseract and pdf2image are imported on first use: together they
+# are most of the API's import time and only the upload path needs them.
+# OCR of scanned PDFs lives in pdf_tools.ocr.
+
+MIN_TEXT_CHARS = 50 # less text than this and the PDF is treated as scanned
+
+def extract_text(pdf_path, ocr=True):
     """
     Extracts text from a PDF file.
     Uses pdfplumber for text-based PDFs and OCR for scanned PDFs.
     
     Args:
         pdf_path (str): Path to the PDF file.
+        ocr (bool): Run OCR here if the text layer is too short. Callers that
+            schedule OCR pages themselves pass False and check needs_ocr().
         
     Returns:
         str: Extracted text.
     """
-    text = ""
+    import pdfplumber
+    
+    parts = []
     with pdfplumber.open(pdf_path) as pdf:
         for page in pdf.pages:
             page_text = page.extract_text()
             if page_text:
-                text += page_text + "\n"
+                parts.append(page_text)
+            # Release the parsed page objects; pdfplumber caches them otherwise
+            page.close()
+    text = "\n".join(parts) + "\n" if parts else ""
+    del parts
     
-    # If text is too short, it might be scanned
-    if len(text.strip()) < 50:
-        print("Text too short, attempting OCR...")
-        try:
-            if convert_from_path:
-                images = convert_from_path(pdf_path)
-                for img in images:
-                    text += pytesseract.image_to_string(img) + "\n"
-            else:
-                print("pdf2image not installed, skipping OCR")
-        except Exception as e:
-            print(f"OCR failed: {e}")
+    if ocr and needs_ocr(text):
+        engine = available_ocr_engine()
+        if engine:
+            try:
+                text += engine.ocr_pdf(pdf_path)
+            except Exception as e:
+                print(f"OCR failed: {e}")
             
     return text
 
 def split_text_into_chunks(text, max_chars_per_page=1500):
     """
     Splits text into chunks suitable for pages.
+    A chunk ends before the paragraph that would overflow it; paragraphs longer
+    than a page are split between lines.
     """
-    # Simple splitting for now
-    # TODO: Respect paragraphs
     chunks = []
-    current_chunk = ""
-    
+    lines = []
+    size = 0
+    paragraph_start = 0 # index in `lines` where the current paragraph begins
+
     for line in text.split('\n'):
-        if len(current_chunk) + len(line) > max_chars_per_page:
-            chunks.append(current_chunk)
-            current_chunk = line + "\n"
-        else:
-            current_chunk += line + "\n"
-            
-    if current_chunk:
-        chunks.append(current_chunk)
-        
+        if lines and size + len(line) + 1 > max_chars_per_page:
+            cut = paragraph_start or len(lines)
+            chunks.append("\n".join(lines[:cut]) + "\n")
+            lines = lines[cut:]
+            size = sum(len(l) + 1 for l in lines)
+            paragraph_start = 0
+
+        lines.append(line)
+        size += len(line) + 1
+        if not line.strip():
+            paragraph_start = len(lines)
+
+    if lines:
+        chunks.append("\n".join(lines) + "\n")
+
     return chunks
+
+def needs_ocr(text):
+    """True if the text layer is too short, i.e. the PDF is probably scanned."""
+    return len(text.strip()) < MIN_TEXT_CHARS
+
+def available_ocr_engine():
+    """The process-wide OcrEngine, or None (with a warning) if the OCR packages are missing."""
+    print("Text too short, attempting OCR...")
+    try:
+        from pdf_tools.ocr import get_ocr_engine
+        import pytesseract
+        import pdf2image
+    except ImportError:
+        print("pdf2image or pytesseract not installed, skipping OCR")
+        return None
+    return get_ocr_engine()
@@ -0,0 +1,182 @@
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+BULLET_RE = re.compile(r"^\s*([-*•▪◦‣·–]|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s+")
+MARKDOWN_HEADING_RE = re.compile(r"^\s*#{1,6}\s+")
+# "2.1 Methods", "3.2.1. Results": a multi-level number, then a capitalized title (so not "1.5 times more")
+NUMBERED_HEADING_RE = re.compile(r"^\s*\d+(\.\d+)+\.?\s+[A-Z]")
+# "Chapter 3", "Part II: Review", "Section 2.1 Methods": keyword, numeral, then nothing or a capitalized
+# title (so not "Part of the reason" or "Section 3 describes the method")
+KEYWORD_HEADING_RE = re.compile(r"^\s*(?i:chapter|section|part|unit|lecture)\s+(\d+(\.\d+)*|[IVXLC]+|[A-Z])\b\.?"
+                                r"(\s*[:\-–—])?(\s+[A-Z0-9].*)?$")
+TERMINAL_PUNCTUATION = (".", ",", ";", "…")
+HYPHEN_BREAK_RE = re.compile(r"(?<=-)(?=\w)")
+
+def unit_width(char: str) -> float:
+    """Default width model: every character is one unit, i.e. max_width is a character count."""
+    return 1.0
+
+def is_heading(line: str) -> bool:
+    stripped = line.strip()
+    if MARKDOWN_HEADING_RE.match(stripped):
+        return True
+    # Numbered headings are short and are not sentences
+    if len(stripped) <= 80 and not stripped.endswith(TERMINAL_PUNCTUATION) and (
+            NUMBERED_HEADING_RE.match(stripped) or KEYWORD_HEADING_RE.match(stripped)):
+        return True
+    letters = [c for c in stripped if c.isalpha()]
+    # Short ALL CAPS lines ("INTRODUCTION", "KEY TERMS")
+    return len(letters) >= 3 and len(stripped) <= 80 and all(c.isupper() for c in letters)
+
+class LineBreaker:
+    """
+    Single-pass, streaming greedy line breaker.
+
+    Widths come from `char_width`, so lines can be fitted to the actual font
+    (see FontRenderer.measure_char) rather than to a character count. Each
+    character width is looked up once, and each distinct word is measured once,
+    so the whole run is linear in the length of the text.
+
+    Input is raw extracted text, as one string or an iterable of lines. It is
+    reflowed paragraph by paragraph:
+    - blank lines end a paragraph and are kept as one empty output line
+    - headings (markdown, numbered, ALL CAPS) become their own block
+    - bullets and numbered items start a block; wrapped lines get a hanging indent
+    - words hyphenated across input lines are rejoined
+    - words wider than a line are hyphenated; hyphenated compounds may break after "-"
+    """
+    def __init__(self, max_width: float, char_width: Callable[[str], float] = unit_width,
+                 hyphenate: bool = True):
+        self.max_width = max_width
+        self.char_width = char_width
+        self.hyphenate = hyphenate
+        self._widths: Dict[str, float] = {}
+        self._words: Dict[str, float] = {} # words repeat a lot, so most are measured once
+        self.space_width = self._width(" ")
+        self.hyphen_width = self._width("-")
+
+    def _width(self, text: str) -> float:
+        width = self._words.get(text)
+        if width is None:
+            if self.char_width is unit_width:
+                width = float(len(text))
+            else:
+                widths = self._widths
+                width = 0.0
+                for char in text:
+                    w = widths.get(char)
+                    if w is None:
+                        w = widths[char] = self.char_width(char)
+                    width += w
+            self._words[text] = width
+        return width
+
+    def break_lines(self, text: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Yields output lines as soon as they are complete."""
+        raw_lines = text.splitlines() if isinstance(text, str) else text
+        block: List[str] = []
+        indent = ""
+        emitted = False
+        pending_blank = False
+
+        def flush() -> Iterator[str]:
+            nonlocal emitted, pending_blank
+            if block:
+                if pending_blank and emitted:
+                    yield ""
+                pending_blank = False
+                for line in self._wrap(" ".join(block), indent):
+                    emitted = True
+                    yield line
+                block.clear()
+
+        for raw in raw_lines:
+            line = raw.strip()
+            if not line:
+                yield from flush()
+                pending_blank = True
+                continue
+
+            if is_heading(line):
+                yield from flush()
+                pending_blank = True
+                block.append(MARKDOWN_HEADING_RE.sub("", line))
+                indent = ""
+                yield from flush()
+                pending_blank = True
+                continue
+
+            bullet = BULLET_RE.match(line)
+            if bullet:
+                yield from flush()
+                marker_width = self._width(bullet.group(0).lstrip())
+                spaces = round(marker_width / self.space_width) if self.space_width else len(bullet.group(0).strip())
+                indent = " " * max(1, spaces)
+                block.append(line)
+                continue
+
+            if block and block[-1].endswith("-") and line[:1].islower():
+                # "exam-" + "ple": a word hyphenated at the end of a PDF line
+                block[-1] = block[-1][:-1] + line
+            else:
+                block.append(line)
+                if len(block) == 1:
+                    indent = ""
+
+        yield from flush()
+
+    def _wrap(self, paragraph: str, indent: str) -> Iterator[str]:
+        max_width = self.max_width
+        # The first line carries the bullet marker; continuation lines start at `indent`
+        line_start = [indent] if indent else []
+        indent_width = self._width(indent)
+
+        parts: List[str] = []
+        width = 0.0
+        fresh = True
+        for word in paragraph.split():
+            # Hyphenated compounds may break after each "-"; pieces after the first are glued
+            pieces = HYPHEN_BREAK_RE.split(word) if self.hyphenate and "-" in word else (word,)
+            for i, piece in enumerate(pieces):
+                glue = 0.0 if (fresh or i > 0) else self.space_width
+                piece_width = self._width(piece)
+
+                if not fresh and width + glue + piece_width > max_width:
+                    yield "".join(parts)
+                    parts, width, fresh, glue = list(line_start), indent_width, True, 0.0
+
+                # Wider than a whole line: hyphenate at the widest prefix that fits
+                while self.hyphenate and width + piece_width > max_width and len(piece) > 1:
+                    head, head_width = self._fit_prefix(piece, max_width - width - self.hyphen_width)
+                    if not head:
+                        head, head_width = piece[0], self._width(piece[0])
+                    parts.append(head + "-")
+                    yield "".join(parts)
+                    piece, piece_width = piece[len(head):], piece_width - head_width
+                    parts, width, fresh = list(line_start), indent_width, True
+
+                if glue:
+                    parts.append(" ")
+                parts.append(piece)
+                width += glue + piece_width
+                fresh = False
+
+        if not fresh:
+            yield "".join(parts)
+
+    def _fit_prefix(self, word: str, available: float):
+        widths = self._widths
+        total = 0.0
+        for i, char in enumerate(word):
+            w = widths.get(char)
+            if w is None:
+                w = widths[char] = self.char_width(char)
+            if total + w > available:
+                return word[:i], total
+            total += w
+        return word, total
+
+def break_lines(text: Union[str, Iterable[str]], max_width: float,
+                char_width: Optional[Callable[[str], float]] = None, hyphenate: bool = True) -> Iterator[str]:
+    """Generator of wrapped lines; see LineBreaker."""
+    return LineBreaker(max_width, char_width or unit_width, hyphenate).break_lines(text)
@@ -0,0 +1,179 @@
+import os
+import threading
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# pdfplumber, pdf2image and the tesseract bindings are imported on first use,
+# as in extractor: most uploads have a text layer and never get here.
+
+MIN_DPI = 150
+MAX_DPI = 300
+TARGET_LONG_SIDE_PX = 3000 # render size for pages with no embedded scan
+BLANK_INK_RATIO = 0.002 # pages with less dark ink than this are not sent to tesseract
+MIN_INK_CONTRAST = 60 # gray levels between ink and paper; closer classes are paper texture or noise
+
+def page_dpi(page) -> int:
+    """
+    Render resolution for one pdfplumber page. A scanned page is rendered at
+    the resolution of its largest embedded image: anything above that is
+    interpolation that tesseract pays for without gaining detail. Other
+    pages are sized from the page dimensions.
+    """
+    dpi = None
+    largest = 0.0
+    for image in page.images:
+        width_in = (image["x1"] - image["x0"]) / 72
+        height_in = (image["bottom"] - image["top"]) / 72
+        srcsize = image.get("srcsize")
+        if width_in > 0 and srcsize and width_in * height_in > largest:
+            largest = width_in * height_in
+            dpi = srcsize[0] / width_in
+    if dpi is None:
+        dpi = TARGET_LONG_SIDE_PX / (max(page.width, page.height) / 72)
+    return int(min(MAX_DPI, max(MIN_DPI, round(dpi))))
+
+def otsu_threshold(gray: np.ndarray) -> Tuple[int, float]:
+    """
+    Otsu threshold of a uint8 grayscale page, plus the gap between the mean
+    levels of the two classes it separates (ink and paper, if there is ink).
+    """
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_dark = np.cumsum(hist)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(hist * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    threshold = int(np.argmax(between))
+    return threshold, float(mean_light[threshold] - mean_dark[threshold])
+
+def binarize(gray: np.ndarray, threshold: Optional[int] = None) -> np.ndarray:
+    """Thresholds a uint8 grayscale page (at its Otsu threshold by default): ink becomes 0, paper 255."""
+    if threshold is None:
+        threshold, _ = otsu_threshold(gray)
+    return np.where(gray > threshold, 255, 0).astype(np.uint8)
+
+def preprocess_page(image: Image.Image) -> Optional[Image.Image]:
+    """
+    Grayscale + binarization for tesseract; returns None for a blank page.
+    Blankness is decided from the Otsu split rather than a fixed gray level, so
+    faded or light text still counts as ink: a page is blank when its two
+    classes are too close to be ink on paper (texture, scanner noise) or when
+    almost nothing falls on the dark side.
+    """
+    gray = np.asarray(image.convert("L"))
+    threshold, contrast = otsu_threshold(gray)
+    if contrast < MIN_INK_CONTRAST:
+        return None
+    binary = binarize(gray, threshold)
+    if np.count_nonzero(binary == 0) < BLANK_INK_RATIO * binary.size:
+        return None
+    return Image.fromarray(binary)
+
+class OcrEngine:
+    """
+    OCR for scanned PDFs. Each page is rendered on its own at page_dpi(),
+    preprocessed in NumPy and recognized, so only the pages in flight are held
+    in memory and pages can run in parallel. The engine has no threads of its
+    own: the upload pipeline runs ocr_page() as bulk-lane tasks on the
+    scheduler (see pipeline.convert), so OCR shares the bulk workers, and
+    ocr_pdf() runs on the caller or on a given executor.
+
+    tesserocr is optional and not in requirements.txt (it builds against the
+    tesseract and leptonica headers). Only when it is installed is tesseract
+    kept loaded: each thread that runs pages holds one initialized API for its
+    lifetime. Without it, pytesseract starts a tesseract process per page, as
+    before, and kills it after `page_timeout` seconds (tesserocr calls cannot
+    be interrupted); the savings are then DPI selection, binarization, skipped
+    blank pages and page parallelism, not process reuse. A page that times out
+    or fails is logged and contributes no text; the rest is still returned.
+    """
+    def __init__(self, page_timeout: float = 60, lang: str = "eng"):
+        self.page_timeout = page_timeout
+        self.lang = lang
+        self._local = threading.local()
+        # Parallelism comes from running pages on several workers; multi-threaded
+        # tesseract per page would oversubscribe the cores
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        try:
+            import tesserocr
+            self._tesserocr = tesserocr
+        except ImportError:
+            self._tesserocr = None
+
+    @classmethod
+    def from_env(cls) -> "OcrEngine":
+        """Settings from INKNOTES_OCR_* env vars."""
+        return cls(
+            page_timeout=float(os.environ.get("INKNOTES_OCR_TIMEOUT", 60)),
+            lang=os.environ.get("INKNOTES_OCR_LANG", "eng"),
+        )
+
+    @property
+    def persistent(self) -> bool:
+        """True if tesseract stays loaded between pages (tesserocr is installed)."""
+        return self._tesserocr is not None
+
+    def page_dpis(self, pdf_path: str) -> List[int]:
+        """Render resolution of every page, in page order."""
+        import pdfplumber
+
+        with pdfplumber.open(pdf_path) as pdf:
+            dpis = []
+            for page in pdf.pages:
+                dpis.append(page_dpi(page))
+                page.close()
+        return dpis
+
+    def ocr_pdf(self, pdf_path: str, executor: Optional[Executor] = None) -> str:
+        """Text of every page, in page order; pages run on `executor` if given, else on the caller."""
+        pages = list(enumerate(self.page_dpis(pdf_path), start=1))
+        if executor is None:
+            texts = [self.ocr_page(pdf_path, number, dpi) for number, dpi in pages]
+        else:
+            futures = [executor.submit(self.ocr_page, pdf_path, number, dpi) for number, dpi in pages]
+            texts = [future.result() for future in futures]
+        return "".join(text + "\n" for text in texts)
+
+    def ocr_page(self, pdf_path: str, page_number: int, dpi: int) -> str:
+        try:
+            return self._ocr_page(pdf_path, page_number, dpi)
+        except Exception as e: # rendering failures, timeouts, TesseractError, tesserocr errors
+            print(f"OCR: page {page_number} of {pdf_path} skipped: {e}")
+            return ""
+
+    def _ocr_page(self, pdf_path: str, page_number: int, dpi: int) -> str:
+        from pdf2image import convert_from_path
+
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number,
+                                   grayscale=True, thread_count=1)
+        if not images:
+            return ""
+        image = preprocess_page(images[0])
+        del images
+        if image is None:
+            return ""
+        return self._recognize(image, dpi)
+
+    def _recognize(self, image: Image.Image, dpi: int) -> str:
+        if self._tesserocr is not None:
+            api = getattr(self._local, "api", None)
+            if api is None:
+                api = self._local.api = self._tesserocr.PyTessBaseAPI(lang=self.lang)
+            api.SetImage(image)
+            api.SetSourceResolution(dpi)
+            return api.GetUTF8Text()
+
+        import pytesseract
+        return pytesseract.image_to_string(image, lang=self.lang, config=f"--dpi {dpi}",
+                                           timeout=self.page_timeout)
+
+@lru_cache(maxsize=1)
+def get_ocr_engine() -> OcrEngine:
+    """Process-wide engine, so its tesserocr APIs outlive a single upload."""
+    return OcrEngine.from_env()
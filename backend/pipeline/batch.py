@@ -0,0 +1,127 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from pipeline.convert import build_job_pdf, submit_pdf_job
+
+class BatchTooLarge(Exception):
+    """Raised while unpacking an upload that exceeds the batch file or byte limit."""
+
+def copy_limited(src, dst, limit: int, chunk_size: int = 1024 * 1024) -> int:
+    """
+    Copies like shutil.copyfileobj, but raises BatchTooLarge once more than
+    `limit` bytes come out of `src`. Zip headers can lie about sizes, so the
+    decompressed bytes are counted as they are written. Returns the byte count.
+    """
+    copied = 0
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if copied > limit:
+            raise BatchTooLarge("uncompressed size limit exceeded")
+        dst.write(chunk)
+
+class Batch:
+    """
+    A group of PDFs submitted together. Each file is an ordinary job (visible
+    under /status/{job_id}) on the shared bulk workers, using the same
+    renderers, fonts and glyph caches; the batch aggregates their progress and
+    tracks rendering throughput.
+    """
+    def __init__(self, batch_id: str, files: List[Tuple[str, str]], merge: bool = False):
+        self.batch_id = batch_id
+        self.files = files # (job_id, original filename), in submission order
+        self.merge = merge
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.result_url: Optional[str] = None
+        self.pages_done = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def page_done(self) -> None:
+        with self._lock:
+            self.pages_done += 1
+
+    def pages_per_sec(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return self.pages_done / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self, jobs: Dict[str, dict]) -> dict:
+        files = []
+        for job_id, name in self.files:
+            job = jobs.get(job_id, {})
+            files.append({"job_id": job_id, "name": name, "status": job.get("status"),
+                          "progress": job.get("progress", 0), "pages": job.get("pages"),
+                          "result_url": job.get("result_url"), "error": job.get("error")})
+
+        progress = sum(f["progress"] for f in files) // len(files) if files else 0
+        return {"batch_id": self.batch_id, "status": self.status, "progress": progress,
+                "files_total": len(files),
+                "files_completed": sum(f["status"] == "completed" for f in files),
+                "files_failed": sum(f["status"] == "failed" for f in files),
+                "pages_done": self.pages_done, "pages_per_sec": round(self.pages_per_sec(), 2),
+                "result_url": self.result_url, "error": self.error, "files": files}
+
+def start_batch(batch: Batch, scheduler, user: str, jobs: Dict[str, dict], upload_dir: str,
+                output_dir: str, style: str, color: str, paper: str, size: int, output: str = "raster") -> List[Future]:
+    """
+    Queues every file of a batch on the scheduler's bulk lane under `user` and
+    returns the per-file futures (see submit_pdf_job) without waiting. With
+    batch.merge, per-file PDFs are skipped and one merged PDF is built once
+    the last file finishes.
+    """
+    batch.status = "processing"
+    batch.started_at = time.perf_counter()
+    remaining = [len(batch.files)]
+
+    def file_done(_future):
+        with batch._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            scheduler.submit_bulk(user, finish_batch, batch, jobs, output_dir)
+
+    futures = []
+    for job_id, _ in batch.files:
+        future = submit_pdf_job(scheduler, user, jobs[job_id], job_id, f"{upload_dir}/{job_id}.pdf",
+                                output_dir, style, color, paper, size, output,
+                                make_pdf=not batch.merge, on_page=batch.page_done)
+        future.add_done_callback(file_done)
+        futures.append(future)
+    return futures
+
+def completed_jobs(batch: Batch, jobs: Dict[str, dict]) -> List[Tuple[str, dict]]:
+    # A file being recolored has all its pages, just with the old or the new ink
+    return [(job_id, jobs[job_id]) for job_id, _ in batch.files
+            if jobs[job_id].get("status") in ("completed", "recoloring")]
+
+def merge_batch_pdf(batch: Batch, jobs: Dict[str, dict], output_dir: str) -> None:
+    """(Re)builds the merged PDF of a batch from its completed files, e.g. after one is recolored."""
+    build_job_pdf(output_dir, completed_jobs(batch, jobs), f"{output_dir}/{batch.batch_id}.pdf")
+    batch.result_url = f"/batch/{batch.batch_id}/download"
+
+def finish_batch(batch: Batch, jobs: Dict[str, dict], output_dir: str) -> None:
+    completed = completed_jobs(batch, jobs)
+
+    if batch.merge and completed:
+        try:
+            merge_batch_pdf(batch, jobs, output_dir)
+        except Exception as e:
+            print(f"Batch {batch.batch_id}: merge failed: {e}")
+            batch.error = str(e)
+
+    batch.finished_at = time.perf_counter()
+    if not completed or batch.error:
+        batch.status = "failed"
+    elif len(completed) < len(batch.files):
+        batch.status = "completed_with_errors"
+    else:
+        batch.status = "completed"
+    print(f"Batch {batch.batch_id}: {batch.pages_done} pages at {batch.pages_per_sec():.2f} pages/sec")
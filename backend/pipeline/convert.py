@@ -0,0 +1,230 @@
+import threading
+import traceback
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pdf_tools.extractor import available_ocr_engine, extract_text, needs_ocr
+from pdf_tools.builder import create_pdf_from_jpegs
+from pipeline.layout import TextLayout
+from pipeline.profiles import MASTER_PROFILE, MASTER_SCALE, OUTPUT_PROFILES, PRINT_DPI, profile_path, write_page_profiles
+
+# raster: page images (and their output profiles) embedded in the PDF.
+# vector: PDF text in the embedded handwriting font, written from the layout tables; no page images.
+OUTPUT_MODES = ("raster", "vector")
+
+def line_spacing_for(size: int) -> int:
+    return int(size * 1.5) # Auto-calc spacing
+
+def page_prefix(output_dir: str, job_id: str, i: int) -> str:
+    return f"{output_dir}/{job_id}_page_{i}"
+
+def mask_path(output_dir: str, job_id: str, i: int) -> str:
+    return f"{output_dir}/{job_id}_mask_{i}.png"
+
+def layout_path(output_dir: str, job_id: str, i: int) -> str:
+    return f"{output_dir}/{job_id}_layout_{i}.npz"
+
+def job_profile_urls(job_id: str, pages: int) -> Dict[str, List[str]]:
+    return {name: [f"/pages/{job_id}/{name}/{i}" for i in range(pages)] for name in OUTPUT_PROFILES}
+
+def job_renderer(size: int):
+    """One master render per page at print resolution; other profiles are downscaled from it."""
+    from renderer.font_renderer import get_font_renderer
+    return get_font_renderer(size, line_spacing_for(size), MASTER_SCALE)
+
+def render_job_page(renderer, output_dir: str, job_id: str, i: int, text: str,
+                    style: str, color: str, paper: str) -> None:
+    # Keep the ink mask so a later color/paper change is a blend, not a re-render
+    mask = renderer.render_ink_mask(text, style=style)
+    mask.save(mask_path(output_dir, job_id, i))
+    write_page_profiles(renderer.colorize(mask, color, paper), page_prefix(output_dir, job_id, i))
+
+def layout_job_page(renderer, output_dir: str, job_id: str, i: int, text: str, style: str) -> None:
+    # Vector output keeps only the layout tables; the PDF (and any recolor) is written from them
+    lines, glyphs = renderer.layout(text, style=style)
+    np.savez(layout_path(output_dir, job_id, i), lines=lines, glyphs=glyphs)
+
+def build_vector_pdf(output_dir: str, jobs: List[Tuple[str, dict]], output_pdf_path: str) -> None:
+    """Writes one vector PDF from the stored layouts of one or more finished jobs, in order."""
+    from renderer.vector_renderer import VectorPdfWriter
+
+    # Jobs merged into one PDF share their font size, hence the page geometry
+    writer = VectorPdfWriter(job_renderer(jobs[0][1]["font_size"]), output_pdf_path, dpi=PRINT_DPI)
+    for job_id, job in jobs:
+        for i in range(job["pages"]):
+            with np.load(layout_path(output_dir, job_id, i)) as page:
+                writer.add_page(page["lines"], page["glyphs"], job["style"], job["color"], job["paper"])
+    writer.save()
+
+def build_job_pdf(output_dir: str, jobs: List[Tuple[str, dict]], output_pdf_path: str) -> None:
+    """Builds one PDF from finished (job_id, job) pairs, in order; each job keeps its own ink and paper."""
+    if jobs[0][1].get("output") == "vector":
+        build_vector_pdf(output_dir, jobs, output_pdf_path)
+    else:
+        build_pdf(output_dir, [(job_id, job["pages"]) for job_id, job in jobs], output_pdf_path)
+
+def build_pdf(output_dir: str, job_pages: List[Tuple[str, int]], output_pdf_path: str) -> None:
+    """Builds one PDF from the print pages of one or more jobs, in order."""
+    print_pages = [profile_path(page_prefix(output_dir, job_id, i), MASTER_PROFILE)
+                   for job_id, pages in job_pages for i in range(pages)]
+    create_pdf_from_jpegs(print_pages, output_pdf_path, dpi=PRINT_DPI)
+
+def submit_pdf_job(scheduler, user: str, job: dict, job_id: str, file_path: str, output_dir: str,
+                   style: str, color: str, paper: str, size: int, output: str = "raster",
+                   make_pdf: bool = True, on_page: Optional[Callable[[], None]] = None) -> Future:
+    """
+    Runs the whole PDF -> handwriting pipeline for one file on the scheduler's
+    bulk lane, reporting status and progress by updating `job` in place.
+
+    The job is split into tasks: one to extract and lay out the text (for a
+    scanned PDF, one more per page to OCR it), one per page to render, and one
+    to build the PDF. All are queued under `user`, so other users'
+    work is interleaved between pages. `output` is one of OUTPUT_MODES. `on_page`
+    is called after each rendered page. The returned future resolves with `job`
+    once it completed or failed.
+    """
+    done: Future = Future()
+    lock = threading.Lock()
+    state = {"layout": None, "remaining": 0}
+
+    def set_job(**fields):
+        job.clear()
+        job.update(fields)
+
+    def fail(e: Exception):
+        with lock:
+            if done.done():
+                return
+            print(f"Job {job_id} failed: {e}")
+            traceback.print_exc()
+            set_job(status="failed", error=str(e))
+            done.set_result(job)
+
+    def prepare():
+        try:
+            set_job(status="processing", progress=10)
+            renderer = job_renderer(size)
+            if output == "vector" and not renderer.font_paths.get(style if style in renderer.fonts else "default"):
+                raise ValueError("Vector output needs a TrueType handwriting font, none is installed")
+
+            # 1. Extract Text
+            print(f"Job {job_id}: Extracting text...")
+            text = extract_text(file_path, ocr=False)
+            engine = available_ocr_engine() if needs_ocr(text) else None
+            dpis = []
+            if engine:
+                try:
+                    dpis = engine.page_dpis(file_path)
+                except Exception as e:
+                    print(f"OCR failed: {e}")
+            if not dpis:
+                lay_out(text)
+                return
+
+            # Scanned PDF: one OCR task per page, so OCR shares the bulk workers
+            # (and their turns between users) like rendering does
+            print(f"Job {job_id}: OCR of {len(dpis)} pages...")
+            state.update(text=text, ocr=[""] * len(dpis), ocr_remaining=len(dpis))
+            for number, dpi in enumerate(dpis, start=1):
+                scheduler.submit_bulk(user, ocr_page, engine, number, dpi)
+        except Exception as e:
+            fail(e)
+
+    def ocr_page(engine, number: int, dpi: int):
+        if done.done():
+            return
+        try:
+            page_text = engine.ocr_page(file_path, number, dpi)
+            with lock:
+                state["ocr"][number - 1] = page_text
+                state["ocr_remaining"] -= 1
+                last = state["ocr_remaining"] == 0
+                total = len(state["ocr"])
+                job["progress"] = 10 + int(20 * (total - state["ocr_remaining"]) / total)
+            if last:
+                lay_out(state.pop("text") + "".join(text + "\n" for text in state.pop("ocr")))
+        except Exception as e:
+            fail(e)
+
+    def lay_out(text: str):
+        """Wraps and paginates the text, then queues one render task per page."""
+        renderer = job_renderer(size)
+        if not text:
+            set_job(status="failed", error="Could not extract text from PDF")
+            done.set_result(job)
+            return
+
+        job["progress"] = 30
+
+        # 2. Split into pages (Smart AI Processing)
+        # Use OpenAI to format text into lines, then chunk into pages
+        from ai.processor import preprocess_text
+
+        print(f"Job {job_id}: AI Preprocessing...")
+        # Without AI, lines are wrapped to the width the renderer will actually draw them at
+        lines = preprocess_text(text, char_width=lambda c: renderer.measure_char(c, style),
+                                max_width=renderer.content_width)
+        # Pack clean lines into one buffer + offset tables, then drop the originals
+        # so an in-flight job holds the text once, plus the pages being rendered.
+        # Pages hold exactly what the renderer draws, which depends on the font size.
+        layout = TextLayout.from_lines(lines, renderer.lines_per_page)
+        del text, lines
+        if layout.page_count == 0:
+            layout = TextLayout.from_lines([" "])
+
+        # 3. Render Pages, one scheduler task each
+        print(f"Job {job_id}: Rendering pages...")
+        state["layout"] = layout
+        state["remaining"] = layout.page_count
+        for i in range(layout.page_count):
+            scheduler.submit_bulk(user, render_page, i)
+
+    def render_page(i: int):
+        if done.done():
+            return # an earlier page failed
+        try:
+            layout = state["layout"]
+            if output == "vector":
+                layout_job_page(job_renderer(size), output_dir, job_id, i, layout.page_text(i), style)
+            else:
+                render_job_page(job_renderer(size), output_dir, job_id, i, layout.page_text(i),
+                                style, color, paper)
+        except Exception as e:
+            fail(e)
+            return
+
+        with lock:
+            state["remaining"] -= 1
+            last = state["remaining"] == 0
+            # Update progress
+            total = state["layout"].page_count
+            job["progress"] = 30 + int(60 * (total - state["remaining"]) / total)
+        if on_page:
+            on_page()
+        if last:
+            scheduler.submit_bulk(user, finish)
+
+    def finish():
+        try:
+            total = state["layout"].page_count
+            result = dict(pages=total, font_size=size, line_spacing=line_spacing_for(size),
+                          style=style, color=color, paper=paper, output=output,
+                          profiles=job_profile_urls(job_id, total) if output == "raster" else {})
+
+            # 4. Create PDF
+            result_url = None
+            if make_pdf:
+                print(f"Job {job_id}: Creating PDF...")
+                build_job_pdf(output_dir, [(job_id, result)], f"{output_dir}/{job_id}.pdf")
+                result_url = f"/download/{job_id}"
+
+            set_job(status="completed", progress=100, result_url=result_url, **result)
+            state["layout"] = None
+            done.set_result(job)
+        except Exception as e:
+            fail(e)
+
+    scheduler.submit_bulk(user, prepare)
+    return done
@@ -0,0 +1,76 @@
+import io
+from array import array
+from typing import Iterable, Iterator
+
+LINES_PER_PAGE = 25 # default only; jobs use FontRenderer.lines_per_page for their font size
+
+class TextLayout:
+    """
+    Compact, read-only line/page table for a whole document.
+
+    All lines live in one text buffer, separated by "\\n". Lines are (start, end)
+    offsets into that buffer and pages are ranges of line indices, both stored
+    in typed `array`s (4 bytes per entry) rather than lists of strings. Because
+    consecutive lines are contiguous in the buffer, the text of a page is a
+    single slice. Memory is about one byte per character of ASCII text plus 8 bytes
+    per line, and rendering only ever copies out the page being drawn.
+    """
+    def __init__(self, buffer: str, line_starts: array, line_ends: array, page_starts: array):
+        self.buffer = buffer
+        self.line_starts = line_starts
+        self.line_ends = line_ends
+        # Index of the first line of each page, plus a trailing sentinel (line count)
+        self.page_starts = page_starts
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str], lines_per_page: int = LINES_PER_PAGE) -> "TextLayout":
+        """
+        Builds the table in one pass over `lines`, which may be a generator; the
+        input is never materialized as a list.
+        """
+        out = io.StringIO()
+        line_starts, line_ends, page_starts = array("I"), array("I"), array("I")
+        offset = 0
+
+        for i, line in enumerate(lines):
+            if i:
+                out.write("\n")
+                offset += 1
+            if i % lines_per_page == 0:
+                page_starts.append(i)
+            out.write(line)
+            line_starts.append(offset)
+            offset += len(line)
+            line_ends.append(offset)
+
+        page_starts.append(len(line_starts))
+        return cls(out.getvalue(), line_starts, line_ends, page_starts)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_starts)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_starts) - 1
+
+    def line(self, i: int) -> str:
+        return self.buffer[self.line_starts[i]:self.line_ends[i]]
+
+    def page_lines(self, page: int) -> range:
+        return range(self.page_starts[page], self.page_starts[page + 1])
+
+    def page_text(self, page: int) -> str:
+        lines = self.page_lines(page)
+        if not lines:
+            return ""
+        return self.buffer[self.line_starts[lines.start]:self.line_ends[lines.stop - 1]]
+
+    def pages(self) -> Iterator[str]:
+        for page in range(self.page_count):
+            yield self.page_text(page)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the table, for job accounting."""
+        tables = (self.line_starts, self.line_ends, self.page_starts)
+        return len(self.buffer) + sum(t.itemsize * len(t) for t in tables)
@@ -0,0 +1,137 @@
+import asyncio
+import io
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from renderer.font_renderer import RenderCancelled, get_font_renderer
+
+# Resolution of the first, fast answer to a preview; the full page follows it.
+DRAFT_SCALE = 0.5
+
+class PreviewSession:
+    """
+    Per-client preview state. Every new request bumps `generation`; renders that
+    belong to an older generation are cancelled between lines and their results
+    are never sent.
+    """
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.generation = 0
+        self.cancel_event: Optional[threading.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def supersede(self) -> Tuple[int, threading.Event]:
+        """Starts a new generation and cancels whatever the previous one is doing."""
+        self.generation += 1
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.cancel_event = threading.Event()
+        return self.generation, self.cancel_event
+
+    def is_current(self, generation: int) -> bool:
+        return generation == self.generation
+
+class PreviewManager:
+    """
+    Debounced, cancellable preview rendering shared by the HTTP and WebSocket
+    preview endpoints. Rendering may raise QueueFull when the preview lane is
+    saturated. Ink masks are cached by layout params, so a request that
+    only changes ink color or paper is a blend rather than a render.
+    """
+    def __init__(self, scheduler, debounce: float = 0.15,
+                 max_sessions: int = 1024, mask_cache_size: int = 64):
+        # Renders run on the scheduler's reserved preview lane
+        self.scheduler = scheduler
+        self.debounce = debounce
+        self.max_sessions = max_sessions
+        self.mask_cache_size = mask_cache_size
+        self._sessions: "OrderedDict[str, PreviewSession]" = OrderedDict()
+        self._masks: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+        self._masks_lock = threading.Lock()
+
+    def session(self, session_id: str) -> PreviewSession:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = PreviewSession(session_id)
+            self._sessions[session_id] = session
+            if len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.supersede()
+        else:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.supersede()
+
+    def render_png(self, req, scale: float = 1.0, cancel: Optional[threading.Event] = None) -> bytes:
+        """Renders the first page of a GenerateRequest to PNG bytes (blocking)."""
+        renderer = get_font_renderer(req.font_size, req.line_spacing, scale)
+        mask = self._get_mask(renderer, req, scale, cancel)
+        img = renderer.colorize(mask, req.ink_color, req.paper_type)
+
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return buf.getvalue()
+
+    def _get_mask(self, renderer, req, scale: float, cancel: Optional[threading.Event]) -> Image.Image:
+        key = (req.text, req.font_style, req.font_size, req.line_spacing, scale)
+        with self._masks_lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+
+        mask = renderer.render_ink_mask(req.text, style=req.font_style, cancel=cancel)
+        with self._masks_lock:
+            self._masks[key] = mask
+            if len(self._masks) > self.mask_cache_size:
+                self._masks.popitem(last=False)
+        return mask
+
+    async def render(self, session_id: str, req, scale: float = 1.0) -> Optional[bytes]:
+        """
+        Renders a preview for a session. Returns None if a newer request for the
+        same session arrived before this one finished.
+        """
+        session = self.session(session_id)
+        generation, cancel = session.supersede()
+
+        await asyncio.sleep(self.debounce)
+        if not session.is_current(generation):
+            return None
+
+        return await self._render_on_lane(req, scale, cancel)
+
+    async def stream(self, session_id: str, req, send) -> None:
+        """
+        Draft-then-refine rendering for streaming clients: sends a reduced
+        resolution page first, then the full page, unless superseded in between.
+        `send(quality, png_bytes)` is awaited for each stage; it is shielded, so
+        being superseded never cuts a message in half.
+        """
+        session = self.session(session_id)
+        generation, cancel = session.supersede()
+        session.task = asyncio.current_task()
+
+        await asyncio.sleep(self.debounce)
+        for quality, scale in (("draft", DRAFT_SCALE), ("full", 1.0)):
+            if not session.is_current(generation):
+                return
+            png = await self._render_on_lane(req, scale, cancel)
+            if png is None or not session.is_current(generation):
+                return
+            await asyncio.shield(send(quality, png))
+
+    async def _render_on_lane(self, req, scale: float, cancel: threading.Event) -> Optional[bytes]:
+        try:
+            return await asyncio.wrap_future(self.scheduler.submit_preview(self.render_png, req, scale, cancel))
+        except RenderCancelled:
+            return None
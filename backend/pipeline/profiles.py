@@ -0,0 +1,50 @@
+from typing import Dict
+
+from PIL import Image
+
+# A 1x page (800x1100) is 8x11in at 100 dpi. Every profile is derived from a
+# single master raster rendered at the print scale; smaller profiles are
+# downscaled from it, never re-rendered.
+BASE_DPI = 100
+PRINT_DPI = 300
+
+OUTPUT_PROFILES: Dict[str, Dict] = {
+    "thumbnail": {"scale": 0.25, "format": "WEBP", "ext": "webp", "options": {"quality": 70, "method": 4}},
+    "screen": {"scale": 1.0, "format": "JPEG", "ext": "jpg", "options": {"quality": 85, "optimize": True}},
+    "print": {"scale": PRINT_DPI / BASE_DPI, "format": "JPEG", "ext": "jpg",
+              "options": {"quality": 92, "dpi": (PRINT_DPI, PRINT_DPI)}},
+}
+
+MASTER_PROFILE = "print"
+MASTER_SCALE = OUTPUT_PROFILES[MASTER_PROFILE]["scale"]
+
+def profile_path(path_prefix: str, profile: str) -> str:
+    return f"{path_prefix}.{profile}.{OUTPUT_PROFILES[profile]['ext']}"
+
+def write_page_profiles(master: Image.Image, path_prefix: str) -> Dict[str, str]:
+    """
+    Encodes one master page (rendered at MASTER_SCALE) into every output profile
+    and returns {profile: path}. Runs on the calling (bulk) worker only: pages
+    are already spread over the bulk workers, and helper threads would take
+    cores outside the bulk share. Each profile is downscaled from the next
+    larger one rather than from the master, which is most of the resize cost.
+    """
+    if master.mode != "RGB":
+        master = master.convert("RGB")
+
+    paths = {}
+    img = master
+    for name in sorted(OUTPUT_PROFILES, key=lambda n: OUTPUT_PROFILES[n]["scale"], reverse=True):
+        img = _resize_to_profile(master, img, name)
+        paths[name] = profile_path(path_prefix, name)
+        profile = OUTPUT_PROFILES[name]
+        img.save(paths[name], format=profile["format"], **profile["options"])
+    return {name: paths[name] for name in OUTPUT_PROFILES}
+
+def _resize_to_profile(master: Image.Image, source: Image.Image, name: str) -> Image.Image:
+    """`source` (master or a larger profile) resized to the pixel size of profile `name`."""
+    ratio = OUTPUT_PROFILES[name]["scale"] / MASTER_SCALE
+    size = (max(1, round(master.width * ratio)), max(1, round(master.height * ratio)))
+    if source.size == size:
+        return source
+    return source.resize(size, Image.LANCZOS, reducing_gap=3.0)
@@ -0,0 +1,174 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Tuple
+
+class QueueFull(Exception):
+    """Raised when a lane is over its configured depth; the API answers 429."""
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"{lane} queue is full, retry in {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+def workers_from_env() -> Tuple[int, int]:
+    """(preview, bulk) worker counts; by default a quarter of the cores is reserved for previews."""
+    cpus = os.cpu_count() or 1
+    preview_workers = int(os.environ.get("INKNOTES_PREVIEW_WORKERS", max(1, cpus // 4)))
+    bulk_workers = int(os.environ.get("INKNOTES_BULK_WORKERS", max(1, cpus - preview_workers)))
+    return preview_workers, bulk_workers
+
+class Scheduler:
+    """
+    Two lanes over one process:
+
+    - preview: a small pool reserved for interactive previews, so they never
+      queue behind document rendering.
+    - bulk: worker threads that serve per-user FIFO queues round-robin. Jobs
+      are submitted as page-sized tasks, so a 500-page upload yields to other
+      users between pages instead of holding workers until it is done.
+
+    Both lanes have a depth limit. Previews are limited by pending renders.
+    Bulk work is limited by admitted jobs (one per file), per user and for the
+    whole process: a job's page tasks are only known after admission, and the
+    user key is client-supplied, so neither limit alone bounds the work. A
+    user or process with nothing admitted is always let in, so one request
+    larger than a limit is still served. New work over a limit is refused with
+    QueueFull, which carries a retry hint based on recent task durations.
+    """
+    def __init__(self, preview_workers: int = 2, bulk_workers: int = 2,
+                 max_preview_queue: int = 32, max_bulk_jobs: int = 1000, max_user_jobs: int = 200):
+        self.preview_workers = preview_workers
+        self.bulk_workers = bulk_workers
+        self.max_preview_queue = max_preview_queue
+        self.max_bulk_jobs = max_bulk_jobs
+        self.max_user_jobs = max_user_jobs
+
+        self._preview_pool = ThreadPoolExecutor(max_workers=preview_workers, thread_name_prefix="preview")
+        self._preview_pending = 0
+
+        self._lock = threading.Lock()
+        self._work_ready = threading.Condition(self._lock)
+        # user -> queued tasks; order of keys is the round-robin order
+        self._bulk_queues: "OrderedDict[str, Deque[Tuple[Future, Callable, tuple]]]" = OrderedDict()
+        self._bulk_pending = 0
+        self._bulk_running = 0
+        self._admitted: Dict[str, int] = {} # user -> admitted, unfinished jobs
+        self._admitted_total = 0
+        self._bulk_task_seconds = 0.5 # moving average, seeds the first retry hints
+
+        for i in range(bulk_workers):
+            threading.Thread(target=self._bulk_worker, name=f"bulk-{i}", daemon=True).start()
+
+    @classmethod
+    def from_env(cls) -> "Scheduler":
+        """Capacity from INKNOTES_* env vars (see workers_from_env)."""
+        preview_workers, bulk_workers = workers_from_env()
+        return cls(
+            preview_workers=preview_workers,
+            bulk_workers=bulk_workers,
+            max_preview_queue=int(os.environ.get("INKNOTES_PREVIEW_QUEUE", 32)),
+            max_bulk_jobs=int(os.environ.get("INKNOTES_BULK_JOBS", 1000)),
+            max_user_jobs=int(os.environ.get("INKNOTES_BULK_USER_JOBS", 200)),
+        )
+
+    # Preview lane
+
+    def submit_preview(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            if self._preview_pending >= self.max_preview_queue:
+                raise QueueFull("preview", retry_after=1)
+            self._preview_pending += 1
+
+        future = self._preview_pool.submit(fn, *args)
+        future.add_done_callback(self._preview_done)
+        return future
+
+    def _preview_done(self, _future: Future) -> None:
+        with self._lock:
+            self._preview_pending -= 1
+
+    # Bulk lane
+
+    def admit_bulk(self, user: str, jobs: int = 1) -> None:
+        """
+        Admits `jobs` new jobs of `user` or raises QueueFull. Tasks of admitted
+        jobs are never refused; each job must be given back with release_bulk
+        when it ends.
+        """
+        with self._lock:
+            user_jobs = self._admitted.get(user, 0)
+            if user_jobs and user_jobs + jobs > self.max_user_jobs:
+                # Round-robin: the user's queue drains at one task per turn of every waiting user
+                backlog = len(self._bulk_queues.get(user, ())) * max(1, len(self._bulk_queues))
+                raise QueueFull("bulk", retry_after=self._bulk_retry_after(backlog))
+            if self._admitted_total and self._admitted_total + jobs > self.max_bulk_jobs:
+                raise QueueFull("bulk", retry_after=self._bulk_retry_after(self._bulk_pending))
+            self._admitted[user] = user_jobs + jobs
+            self._admitted_total += jobs
+
+    def release_bulk(self, user: str, jobs: int = 1) -> None:
+        with self._lock:
+            left = self._admitted.get(user, 0) - jobs
+            if left > 0:
+                self._admitted[user] = left
+            else:
+                self._admitted.pop(user, None)
+            self._admitted_total = max(0, self._admitted_total - jobs)
+
+    def submit_bulk(self, user: str, fn: Callable, *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._bulk_queues.setdefault(user, deque()).append((future, fn, args))
+            self._bulk_pending += 1
+            self._work_ready.notify()
+        return future
+
+    def _bulk_retry_after(self, backlog: int) -> int:
+        """Seconds until `backlog` queued tasks have run, at the recent task duration."""
+        return max(1, math.ceil(backlog * self._bulk_task_seconds / self.bulk_workers))
+
+    def _next_bulk_task(self) -> Tuple[Future, Callable, tuple]:
+        with self._lock:
+            while not self._bulk_queues:
+                self._work_ready.wait()
+            # Take one task from the user at the head, then send them to the back
+            user, queue = next(iter(self._bulk_queues.items()))
+            task = queue.popleft()
+            if queue:
+                self._bulk_queues.move_to_end(user)
+            else:
+                del self._bulk_queues[user]
+            self._bulk_pending -= 1
+            self._bulk_running += 1
+            return task
+
+    def _bulk_worker(self) -> None:
+        while True:
+            future, fn, args = self._next_bulk_task()
+            start = time.perf_counter()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._bulk_running -= 1
+                    self._bulk_task_seconds = 0.8 * self._bulk_task_seconds + 0.2 * elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "preview": {"workers": self.preview_workers, "pending": self._preview_pending,
+                            "max_queue": self.max_preview_queue},
+                "bulk": {"workers": self.bulk_workers, "queued": self._bulk_pending,
+                         "running": self._bulk_running, "users_waiting": len(self._bulk_queues),
+                         "jobs": self._admitted_total, "max_jobs": self.max_bulk_jobs,
+                         "max_user_jobs": self.max_user_jobs,
+                         "avg_task_ms": round(self._bulk_task_seconds * 1000, 1)},
+            }
@@ -0,0 +1,90 @@
+import importlib
+import string
+import threading
+import time
+from typing import Dict
+
+# "background": serve immediately, warm up in a thread, /ready flips when done
+# "eager":      warm up before the server accepts requests
+# "lazy":       no warm-up; everything loads on first use
+STARTUP_MODES = ("background", "eager", "lazy")
+
+# Optional heavy modules only needed on the upload path
+PRELOAD_MODULES = ("pdfplumber", "pytesseract", "pdf2image")
+
+# Every printable ASCII glyph, so the fast path's glyph caches start populated
+WARMUP_TEXT = "\n".join([string.ascii_letters, string.digits + string.punctuation])
+
+class WarmupState:
+    def __init__(self):
+        self.ready = False
+        self.mode = None
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def as_dict(self) -> dict:
+        return {"ready": self.ready, "mode": self.mode,
+                "timings_ms": {k: round(v * 1000, 1) for k, v in self.timings.items()},
+                "errors": self.errors}
+
+state = WarmupState()
+
+def warm_up(preload_model: bool = False) -> WarmupState:
+    """
+    Loads everything the first requests would otherwise pay for: fonts and glyph
+    caches for the default preview/job renderers, paper backgrounds, the optional
+    upload-path modules, the OpenAI client and, if asked, the handwriting model.
+    A failing step is recorded and skipped; the process still becomes ready.
+    """
+    _step("renderers", _warm_renderers)
+    for module in PRELOAD_MODULES:
+        _step(module, importlib.import_module, module)
+    _step("openai", _warm_openai)
+    if preload_model:
+        _step("handwriting_model", _warm_model)
+
+    state.ready = True
+    return state
+
+def start_warmup(mode: str = "background", preload_model: bool = False) -> None:
+    if mode not in STARTUP_MODES:
+        raise ValueError(f"Unknown startup mode {mode!r}, expected one of {STARTUP_MODES}")
+    state.mode = mode
+
+    if mode == "lazy":
+        state.ready = True
+    elif mode == "eager":
+        warm_up(preload_model)
+    else:
+        threading.Thread(target=warm_up, args=(preload_model,), name="warmup", daemon=True).start()
+
+def _step(name: str, fn, *args) -> None:
+    start = time.perf_counter()
+    try:
+        fn(*args)
+    except Exception as e:
+        print(f"Warning: warm-up step {name} failed: {e}")
+        state.errors[name] = str(e)
+    state.timings[name] = time.perf_counter() - start
+
+def _warm_renderers() -> None:
+    from renderer.font_renderer import PAPER_TYPES, get_font_renderer
+    from pipeline.preview import DRAFT_SCALE
+    from pipeline.profiles import MASTER_SCALE
+
+    # Defaults of GenerateRequest (preview) and of /upload (size 28, spacing 1.5x)
+    configs = [(28, 40, 1.0), (28, 40, DRAFT_SCALE), (28, 42, MASTER_SCALE)]
+    for font_size, line_spacing, scale in configs:
+        renderer = get_font_renderer(font_size, line_spacing, scale)
+        for paper in PAPER_TYPES:
+            renderer.get_background(paper)
+        for style in renderer.fonts:
+            renderer.render_ink_mask(WARMUP_TEXT, style=style)
+
+def _warm_openai() -> None:
+    from ai.processor import get_client
+    get_client()
+
+def _warm_model() -> None:
+    from handwriting_model.wrapper import get_handwriting_model
+    get_handwriting_model()
@@ -1,32 +1,89 @@
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageFont, ImageOps
 import random
 import os
+import threading
+import numpy as np
+from functools import lru_cache
 from typing import Dict, Tuple, Optional, Union
 
+INK_COLORS: Dict[str, Tuple[int, int, int]] = {
+    "blue": (0, 50, 180),
+    "black": (20, 20, 20),
+    "red": (200, 0, 0),
+    "green": (0, 100, 0),
+    "pink": (255, 105, 180),
+    "white": (230, 230, 230)
+}
+
+PAPER_TYPES = ("blank", "line", "grid", "dark")
+
+# Fast-path layout tables (see FontRenderer.layout). Coordinates are line-local pixels.
+LINE_DTYPE = np.dtype([("y", np.int32), ("angle", np.float32), ("x_drift", np.int32),
+                       ("start", np.uint32), ("end", np.uint32)])
+GLYPH_DTYPE = np.dtype([("x", np.int32), ("y", np.int32), ("angle", np.int8),
+                        ("opacity", np.uint8), ("char", np.uint32)])
+
+def resolve_ink_color(color_name: str) -> Tuple[int, int, int]:
+    """Maps a named ink or a #hex string to an RGB tuple (falls back to blue)."""
+    if color_name.startswith("#"):
+        return ImageColor.getrgb(color_name)[:3]
+    return INK_COLORS.get(color_name, INK_COLORS["blue"])
+
+# Limits for client-supplied layout parameters, in 1x pixels
+FONT_SIZE_RANGE = (12, 72)
+LINE_SPACING_RANGE = (16, 120)
+
+class RenderCancelled(Exception):
+    """Raised by render_ink_mask when its cancel event is set between lines."""
+
 class FontRenderer:
+    GLYPH_ANGLE_STEP = 0.25 # degrees; fast-path glyph rotation jitter is quantized to this
+
     def __init__(self, width: int = 800, height: int = 1100, font_dir: str = "backend/assets/fonts", 
                  background_type: str = "blank", 
                  font_size: int = 28, 
                  line_spacing: int = 40,
                  margin_left: int = 50,
                  margin_top: int = 50,
-                 ink_color: str = "blue"):
-        self.width = width
-        self.height = height
+                 ink_color: str = "blue",
+                 fast_path: bool = True,
+                 scale: float = 1.0):
+        # All geometry is given at 1x and multiplied by scale, so a scaled renderer
+        # lays out the same page at a lower (draft) or higher (print) resolution.
+        self.scale = scale
+        self.width = self._px(width)
+        self.height = self._px(height)
         self.font_dir = font_dir
         self.background_type = background_type
-        self.font_size = font_size
-        self.line_spacing = line_spacing
-        self.margin_left = margin_left
-        self.margin_top = margin_top
+        self.font_size = self._px(font_size)
+        self.line_spacing = self._px(line_spacing)
+        self.margin_left = self._px(margin_left)
+        self.margin_top = self._px(margin_top)
         self.ink_color_name = ink_color
+        self.fast_path = fast_path
         
-        self.background = self._create_background()
+        # Rotated glyph coverage, keyed by (style, char, angle bucket) -> (coverage, dx, dy)
+        self._glyph_cache: Dict[Tuple[str, str, int], Tuple[np.ndarray, int, int]] = {}
+        self._advances: Dict[Tuple[str, str], int] = {}
         
-        # Load fonts
+        # Paper layers are independent of the ink, so they are built once per type
+        self._backgrounds: Dict[str, Image.Image] = {}
+        self.background = self.get_background(background_type)
+        
+        # Load fonts; font_paths maps each style to its TTF (None for Pillow's built-in font)
         self.fonts: Dict[str, ImageFont.FreeTypeFont] = {}
+        self.font_paths: Dict[str, Optional[str]] = {}
         self._load_fonts()
 
+    def _px(self, value: float) -> int:
+        """Converts a 1x pixel length to this renderer's resolution."""
+        return int(round(value * self.scale))
+
+    @property
+    def lines_per_page(self) -> int:
+        """Lines that fit between the top margin and the bottom limit; later lines are not drawn."""
+        return max(1, (self.height - self._px(50) - self.margin_top) // self.line_spacing + 1)
+
     def _load_fonts(self) -> None:
         try:
             # Helper to find first available font
@@ -50,112 +107,289 @@ class FontRenderer:
                 
             if not default_path: raise OSError("No fonts found")
 
-            self.fonts["default"] = ImageFont.truetype(default_path, size=self.font_size)
-            self.fonts["heading"] = ImageFont.truetype(bold_path or default_path, size=self.font_size + 10)
-            self.fonts["messy"] = ImageFont.truetype(messy_path or default_path, size=self.font_size)
-            self.fonts["cursive"] = ImageFont.truetype(cursive_path or default_path, size=self.font_size)
-            self.fonts["handlee"] = ImageFont.truetype(handlee_path or default_path, size=self.font_size)
+            self.font_paths = {
+                "default": default_path,
+                "heading": bold_path or default_path,
+                "messy": messy_path or default_path,
+                "cursive": cursive_path or default_path,
+                "handlee": handlee_path or default_path,
+            }
+            for style, path in self.font_paths.items():
+                size = self.font_size + self._px(10) if style == "heading" else self.font_size
+                self.fonts[style] = ImageFont.truetype(path, size=size)
             
             print(f"Loaded font: {default_path}")
 
         except Exception as e:
             print(f"Warning: Fonts not found ({e}). Using default.")
+            self.font_paths = dict.fromkeys(("default", "heading", "messy", "cursive", "handlee"))
             self.fonts["default"] = ImageFont.load_default() 
             self.fonts["heading"] = ImageFont.load_default()
             self.fonts["messy"] = ImageFont.load_default() 
             self.fonts["cursive"] = ImageFont.load_default()
             self.fonts["handlee"] = ImageFont.load_default()
 
-    def _create_background(self) -> Image.Image:
+    def get_background(self, background_type: Optional[str] = None) -> Image.Image:
+        """Returns the cached paper layer for the given type. Callers must not mutate it."""
+        background_type = background_type or self.background_type
+        if background_type not in self._backgrounds:
+            self._backgrounds[background_type] = self._create_background(background_type)
+        return self._backgrounds[background_type]
+
+    def _create_background(self, background_type: str) -> Image.Image:
         # White or Dark
         bg_color: Union[str, Tuple[int, int, int]] = "white"
-        if self.background_type == "dark":
+        if background_type == "dark":
             bg_color = (30, 30, 30)
             
-        img = Image.new("RGBA", (self.width, self.height), bg_color)
+        # Pages are opaque, so RGB: a quarter less memory per page than RGBA
+        img = Image.new("RGB", (self.width, self.height), bg_color)
         draw = ImageDraw.Draw(img)
+        rule_width = max(1, self._px(1))
         
-        if self.background_type == "line":
-            draw.line([(self.margin_left + 10, 0), (self.margin_left + 10, self.height)], fill=(255, 100, 100), width=1)
+        if background_type == "line":
+            draw.line([(self.margin_left + self._px(10), 0), (self.margin_left + self._px(10), self.height)], fill=(255, 100, 100), width=rule_width)
             for y in range(self.margin_top, self.height, self.line_spacing):
-                draw.line([(0, y), (self.width, y)], fill=(200, 200, 255), width=1)
+                draw.line([(0, y), (self.width, y)], fill=(200, 200, 255), width=rule_width)
                 
-        elif self.background_type == "grid":
+        elif background_type == "grid":
             grid_size = self.line_spacing
             for x in range(0, self.width, grid_size):
-                draw.line([(x, 0), (x, self.height)], fill=(230, 230, 230), width=1)
+                draw.line([(x, 0), (x, self.height)], fill=(230, 230, 230), width=rule_width)
             for y in range(0, self.height, grid_size):
-                draw.line([(0, y), (self.width, y)], fill=(230, 230, 230), width=1)
+                draw.line([(0, y), (self.width, y)], fill=(230, 230, 230), width=rule_width)
             
         return img
 
-    def render_to_image(self, text: str, style: str = "default", color_override: Optional[str] = None) -> Image.Image:
+    def render_to_image(self, text: str, style: str = "default", color_override: Optional[str] = None,
+                        paper_override: Optional[str] = None) -> Image.Image:
         """Renders text and returns the PIL Image object."""
-        img = self.background.copy()
-        
-        # Ink resolution
-        color_name = color_override or self.ink_color_name
-        colors = {
-            "blue": (0, 50, 180),
-            "black": (20, 20, 20),
-            "red": (200, 0, 0),
-            "green": (0, 100, 0),
-            "pink": (255, 105, 180),
-            "white": (230, 230, 230)
-        }
-        
-        if color_name.startswith("#"):
-            from PIL import ImageColor
-            base_color = ImageColor.getrgb(color_name)
-        else:
-            base_color = colors.get(color_name, colors["blue"])
+        mask = self.render_ink_mask(text, style)
+        return self.colorize(mask, color_override, paper_override)
 
-        font = self.fonts.get(style, self.fonts["default"])
+    def render_ink_mask(self, text: str, style: str = "default",
+                        cancel: Optional[threading.Event] = None) -> Image.Image:
+        """
+        Lays out and rasterizes text as a single-channel ("L") ink coverage mask.
+        The mask carries all the per-character jitter, so it can be re-colored or
+        moved onto another paper with colorize() without running layout again.
+        If `cancel` is set while rendering, RenderCancelled is raised at the next line.
+        """
+        if self.fast_path:
+            lines, glyphs = self.layout(text, style)
+            return self.rasterize(lines, glyphs, style, cancel)
+        
+        mask = Image.new("L", (self.width, self.height), 0)
+        if style not in self.fonts:
+            style = "default"
         
         cursor_y = self.margin_top
         
-        for line in text.splitlines():
-            # Create a temporary transparent line image to draw words onto
-            line_height = int(self.font_size * 2)
-            line_width = self.width - (self.margin_left * 2) # content width
-            
-            line_img = Image.new('RGBA', (line_width, line_height), (255, 255, 255, 0))
-            
-            # Cursor within the line image
-            line_cursor_x = 0
-            
-            # Word-level randomization
-            words = line.split(" ")
+        for line in text.splitlines()[:self.lines_per_page]:
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled()
             
-            for word in words:
-                word += " "
-                
-                # Render word char by char
-                for char in word:
-                    self._draw_char(line_img, char, line_cursor_x + 10, line_height//2, font, base_color)
-                    
-                    char_bbox = font.getbbox(char)
-                    char_width = char_bbox[2] - char_bbox[0] if char_bbox else 10
-                    
-                    line_cursor_x += char_width + random.randint(0, 2) # kerning jitter relative
-            
-            # Line-level Rotation (Slope)
-            line_angle = random.uniform(-0.5, 0.5)
-            rotated_line = line_img.rotate(line_angle, resample=Image.BICUBIC, expand=1)
-            
-            # Paste line onto page
-            x_drift = random.randint(-2, 5)
-            paste_x = self.margin_left + x_drift
-            
-            # Paste
-            img.alpha_composite(rotated_line, dest=(paste_x, cursor_y))
+            self._draw_line(mask, line, style, cursor_y)
             
             cursor_y += self.line_spacing
+
+        return mask
+
+    def layout(self, text: str, style: str = "default") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fast-path layout pass. Returns (lines, glyphs): one LINE_DTYPE record per
+        line that fits on the page and one GLYPH_DTYPE record per character, in
+        line-local pixels. All per-glyph jitter (rotation, baseline, kerning,
+        opacity) is drawn here in bulk, so rasterize() is deterministic.
+        """
+        if style not in self.fonts:
+            style = "default"
+        
+        page_lines = []
+        cursor_y = self.margin_top
+        for line in text.splitlines()[:self.lines_per_page]:
+            page_lines.append((line + " ", cursor_y)) # every word is followed by a space
+            cursor_y += self.line_spacing
+        
+        n_glyphs = sum(len(chars) for chars, _ in page_lines)
+        lines = np.zeros(len(page_lines), dtype=LINE_DTYPE)
+        glyphs = np.zeros(n_glyphs, dtype=GLYPH_DTYPE)
+        if not page_lines:
+            return lines, glyphs
+        
+        # Per-call generator: cheap, and safe when one renderer serves several threads
+        rng = np.random.default_rng()
+        baseline_y = int(self.font_size * 2) // 2 + int(self.font_size * 0.4)
+        glyphs["angle"] = np.rint(rng.uniform(-1.5, 1.5, n_glyphs) / self.GLYPH_ANGLE_STEP)
+        glyphs["opacity"] = rng.integers(220, 255, n_glyphs, endpoint=True)
+        glyphs["y"] = baseline_y + rng.integers(-self._px(1), self._px(2), n_glyphs, endpoint=True)
+        kerning = rng.integers(0, self._px(2), n_glyphs, endpoint=True) # kerning jitter relative
+        
+        lines["angle"] = rng.uniform(-0.5, 0.5, len(page_lines))
+        lines["x_drift"] = rng.integers(-self._px(2), self._px(5), len(page_lines), endpoint=True)
+        
+        start = 0
+        for i, (chars, cursor_y) in enumerate(page_lines):
+            end = start + len(chars)
+            glyphs["char"][start:end] = np.fromiter(map(ord, chars), dtype=np.uint32, count=len(chars))
+            advances = np.fromiter((self._advance(style, c) for c in chars), dtype=np.int32, count=len(chars))
+            advances += kerning[start:end]
+            glyphs["x"][start] = self._px(10)
+            np.cumsum(advances[:-1], out=glyphs["x"][start + 1:end])
+            glyphs["x"][start + 1:end] += self._px(10)
+            lines[i]["y"], lines[i]["start"], lines[i]["end"] = cursor_y, start, end
+            start = end
+        
+        return lines, glyphs
+
+    def rasterize(self, lines: np.ndarray, glyphs: np.ndarray, style: str = "default",
+                  cancel: Optional[threading.Event] = None) -> Image.Image:
+        """Draws a layout() result into an ink mask."""
+        if style not in self.fonts:
+            style = "default"
+        
+        mask = Image.new("L", (self.width, self.height), 0)
+        for line in lines.tolist():
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled()
+            cursor_y, line_angle, x_drift, start, end = line
+            self._draw_line_fast(mask, glyphs[start:end], style, cursor_y, line_angle, x_drift)
+        
+        return mask
+
+    def _draw_line(self, mask: Image.Image, line: str, style: str, cursor_y: int) -> None:
+        """Reference path: every character is composited and the whole line canvas is rotated."""
+        font = self.fonts[style]
+        
+        # Create a temporary coverage image for the line to draw words onto
+        line_height = int(self.font_size * 2)
+        line_width = self.width - (self.margin_left * 2) # content width
+        
+        line_mask = Image.new("L", (line_width, line_height), 0)
+        
+        # Cursor within the line image
+        line_cursor_x = 0
+        
+        # Word-level randomization
+        words = line.split(" ")
+        
+        for word in words:
+            word += " "
             
-            if cursor_y > self.height - 50:
-                break
+            # Render word char by char
+            for char in word:
+                self._draw_char(line_mask, char, line_cursor_x + self._px(10), line_height//2, font)
+                
+                line_cursor_x += self._char_width(font, char) + random.randint(0, self._px(2)) # kerning jitter relative
+        
+        # Line-level Rotation (Slope)
+        line_angle = random.uniform(-0.5, 0.5)
+        rotated_line = line_mask.rotate(line_angle, resample=Image.BICUBIC, expand=1)
+        
+        # Paste line onto page
+        x_drift = random.randint(-self._px(2), self._px(5))
+        paste_x = self.margin_left + x_drift
+        
+        self._composite_coverage(mask, rotated_line, paste_x, cursor_y)
 
-        return img
+    def _draw_line_fast(self, mask: Image.Image, glyphs: np.ndarray, style: str, cursor_y: int,
+                        line_angle: float, x_drift: int) -> None:
+        """
+        Fast path: glyph coverage comes from a cache of pre-rotated glyphs and is
+        blitted into one float buffer at the laid-out offsets, then the slope is
+        applied to the line's tight bounding box with a single rotate.
+        """
+        line_height = int(self.font_size * 2)
+        line_width = self.width - (self.margin_left * 2) # content width
+        
+        # Raster pass: coverage "over" in one buffer, no per-glyph images
+        coverage = np.zeros((line_height, line_width), dtype=np.float32)
+        for x, y, angle_bucket, opacity, code in glyphs.tolist():
+            glyph, dx, dy = self._get_glyph(style, chr(code), angle_bucket)
+            if glyph.size == 0:
+                continue
+            x0, y0 = x + dx, y + dy
+            x1, y1 = x0 + glyph.shape[1], y0 + glyph.shape[0]
+            cx0, cy0, cx1, cy1 = max(x0, 0), max(y0, 0), min(x1, line_width), min(y1, line_height)
+            if cx0 >= cx1 or cy0 >= cy1:
+                continue
+            region = coverage[cy0:cy1, cx0:cx1]
+            g = glyph[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] * np.float32(opacity / (255.0 * 255.0))
+            region += g - region * g
+        
+        line_mask = Image.fromarray(np.rint(coverage * 255).astype(np.uint8), mode="L")
+        
+        # Slope: rotate only the inked part of the line
+        bbox = line_mask.getbbox()
+        if bbox is None:
+            return
+        
+        tight = line_mask.crop(bbox)
+        rotated = tight.rotate(line_angle, resample=Image.BICUBIC, expand=1)
+        paste_x = self.margin_left + x_drift + bbox[0] - (rotated.width - tight.width) // 2
+        paste_y = cursor_y + bbox[1] - (rotated.height - tight.height) // 2
+        
+        self._composite_coverage(mask, rotated, paste_x, paste_y)
+
+    def _get_glyph(self, style: str, char: str, angle_bucket: int) -> Tuple[np.ndarray, int, int]:
+        """Returns cached (uint8 coverage, dx, dy) for a rotated glyph, relative to its anchor."""
+        key = (style, char, angle_bucket)
+        cached = self._glyph_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        char_size = int(self.font_size * 3.5)
+        txt_mask = Image.new("L", (char_size, char_size), 0)
+        ImageDraw.Draw(txt_mask).text((char_size//2, char_size//2), char, font=self.fonts[style], fill=255, anchor="mm")
+        rotated = txt_mask.rotate(angle_bucket * self.GLYPH_ANGLE_STEP, resample=Image.BICUBIC, expand=0)
+        
+        bbox = rotated.getbbox()
+        if bbox is None:
+            cached = (np.zeros((0, 0), dtype=np.uint8), 0, 0)
+        else:
+            glyph = np.asarray(rotated.crop(bbox)) # uint8: a quarter of the memory of float coverage
+            cached = (glyph, bbox[0] - char_size//2, bbox[1] - char_size//2)
+        
+        self._glyph_cache[key] = cached
+        return cached
+
+    def _advance(self, style: str, char: str) -> int:
+        """Cached horizontal advance of a character, as used by layout()."""
+        key = (style, char)
+        advance = self._advances.get(key)
+        if advance is None:
+            advance = self._advances[key] = self._char_width(self.fonts[style], char)
+        return advance
+
+    @property
+    def content_width(self) -> int:
+        """Width a line of text can use in layout(), allowing for the start offset and line drift."""
+        return self.width - self.margin_left * 2 - self._px(10) - self._px(5)
+
+    def measure_char(self, char: str, style: str = "default") -> float:
+        """Expected width of a character in layout(): its advance plus the mean kerning jitter."""
+        if style not in self.fonts:
+            style = "default"
+        return self._advance(style, char) + self._px(2) / 2
+
+    def _char_width(self, font: ImageFont.FreeTypeFont, char: str) -> int:
+        char_bbox = font.getbbox(char)
+        return char_bbox[2] - char_bbox[0] if char_bbox else self._px(10)
+
+    def colorize(self, mask: Image.Image, color_override: Optional[str] = None,
+                 paper_override: Optional[str] = None) -> Image.Image:
+        """
+        Produces the final page from an ink mask: a flat ink layer blended onto the
+        cached paper through the mask. This is the only step that depends on the
+        ink color and paper type.
+        """
+        background = self.get_background(paper_override)
+        if mask.size != background.size:
+            raise ValueError(f"Mask size {mask.size} does not match page size {background.size}")
+        
+        base_color = resolve_ink_color(color_override or self.ink_color_name)
+        ink = Image.new("RGB", background.size, base_color)
+        return Image.composite(ink, background, mask)
 
     def render_text(self, text: str, output_path: str, style: str = "default", color_override: Optional[str] = None) -> str:
         """
@@ -165,28 +399,42 @@ class FontRenderer:
         img.save(output_path)
         return output_path
 
-    def _draw_char(self, img: Image.Image, char: str, x: int, y: int, font: ImageFont.FreeTypeFont, base_color: Tuple) -> None:
+    def _draw_char(self, mask: Image.Image, char: str, x: int, y: int, font: ImageFont.FreeTypeFont) -> None:
         char_size = int(self.font_size * 3.5) # Scale temp canvas by font size
-        txt_img = Image.new('RGBA', (char_size, char_size), (255, 255, 255, 0))
-        d = ImageDraw.Draw(txt_img)
+        txt_mask = Image.new("L", (char_size, char_size), 0)
+        d = ImageDraw.Draw(txt_mask)
         
         # Draw char
         # Add random opacity variation
-        opacity = 255 if len(base_color) == 3 else base_color[3]
-        if opacity > 200: opacity = random.randint(220, 255)
-        
-        fill_color = base_color[:3] + (opacity,)
+        opacity = random.randint(220, 255)
         
-        d.text((char_size//2, char_size//2), char, font=font, fill=fill_color, anchor="mm")
+        d.text((char_size//2, char_size//2), char, font=font, fill=opacity, anchor="mm")
         
         # Rotation
         angle = random.uniform(-1.5, 1.5) 
-        rotated_txt = txt_img.rotate(angle, resample=Image.BICUBIC, expand=0)
+        rotated_txt = txt_mask.rotate(angle, resample=Image.BICUBIC, expand=0)
         
         # Baseline Jitter
-        y_offset = random.randint(-1, 2)
+        y_offset = random.randint(-self._px(1), self._px(2))
         
         paste_x = int(x - char_size//2)
         paste_y = int(y + y_offset - char_size//2 + self.font_size*0.4) 
         
-        img.alpha_composite(rotated_txt, dest=(paste_x, paste_y))
+        self._composite_coverage(mask, rotated_txt, paste_x, paste_y)
+
+    @staticmethod
+    def _composite_coverage(dest: Image.Image, src: Image.Image, x: int, y: int) -> None:
+        """Coverage "over" operator for masks: screen(a, b) == a + b - a*b."""
+        box = (x, y, x + src.width, y + src.height)
+        dest.paste(ImageChops.screen(dest.crop(box), src), box)
+
+@lru_cache(maxsize=8)
+def get_font_renderer(font_size: int = 28, line_spacing: int = 40, scale: float = 1.0) -> FontRenderer:
+    """
+    Shared renderer per layout configuration. Ink and paper are applied per call
+    via colorize(), so they are not part of the key; fonts and glyph caches are
+    loaded once per process instead of once per request. A print-scale renderer
+    holds well over 100 MB of paper layers and glyphs, hence the small cache and
+    the limits on client-supplied sizes (FONT_SIZE_RANGE, LINE_SPACING_RANGE).
+    """
+    return FontRenderer(font_size=font_size, line_spacing=line_spacing, scale=scale)
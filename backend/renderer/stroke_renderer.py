@@ -1,7 +1,10 @@
 from PIL import Image, ImageDraw, ImageOps
 import random
 import numpy as np
-from typing import List, Tuple, Union, Optional
+from typing import List, Sequence, Tuple, Union, Optional
+
+# A stroke is a list of (x, y) points or an (n, 2) array, e.g. a view into a StrokeStore
+Stroke = Union[np.ndarray, Sequence[Tuple[float, float]]]
 
 class StrokeRenderer:
     def __init__(self, width: int = 800, height: int = 1100, background_type: str = "line"):
@@ -38,7 +41,7 @@ class StrokeRenderer:
                     
         return img
 
-    def render_to_image(self, all_lines_strokes: List[Tuple[List[List[Tuple[float, float]]], int]]) -> Image.Image:
+    def render_to_image(self, all_lines_strokes: List[Tuple[List[Stroke], int]]) -> Image.Image:
         """
         Renders multiple lines of strokes and returns the PIL image.
         """
@@ -52,7 +55,7 @@ class StrokeRenderer:
             
         return img
 
-    def render_strokes(self, all_lines_strokes: List[Tuple[List[List[Tuple[float, float]]], int]], output_path: str) -> str:
+    def render_strokes(self, all_lines_strokes: List[Tuple[List[Stroke], int]], output_path: str) -> str:
         """
         Renders multiple lines of strokes onto the page and saves to file.
         """
@@ -60,20 +63,23 @@ class StrokeRenderer:
         img.save(output_path)
         return output_path
 
-    def _draw_line_strokes(self, draw: ImageDraw.ImageDraw, strokes: List[List[Tuple[float, float]]], start_x: float, start_y: float) -> None:
+    def _draw_line_strokes(self, draw: ImageDraw.ImageDraw, strokes: List[Stroke], start_x: float, start_y: float) -> None:
         """
         Draws a single line of text (set of strokes).
+        The strokes are packed into one array plus a table of stroke bounds, so
+        scaling and smoothing are a handful of array operations per line.
+        Stroke arrays are only read, so StrokeStore views can be passed as-is.
         """
         if not strokes: return
 
-        all_x = [pt[0] for stroke in strokes for pt in stroke]
-        all_y = [pt[1] for stroke in strokes for pt in stroke]
-        
-        if not all_x: return
+        arrays = [np.asarray(stroke).reshape(-1, 2) for stroke in strokes]
+        bounds = np.zeros(len(arrays) + 1, dtype=np.intp)
+        np.cumsum([len(a) for a in arrays], out=bounds[1:])
+        if not bounds[-1]: return
+        points = np.concatenate(arrays, dtype=np.float64)
 
-        min_x = min(all_x)
-        min_y = min(all_y)
-        max_y = max(all_y)
+        min_x, min_y = points.min(axis=0)
+        max_y = points[:, 1].max()
         
         stroke_height = max_y - min_y
         target_height = 40 # Slightly larger than line spacing to allow ascenders/descenders
@@ -84,45 +90,51 @@ class StrokeRenderer:
         else:
             scale = 0.5
         
-        for stroke in strokes:
-            points = []
-            for x, y in stroke:
-                # Apply scaling and offset
-                px = (x - min_x) * scale + start_x
-                py = (y - min_y) * scale + start_y
-                points.append((px, py))
-            
-            if len(points) > 2:
-                # Apply smoothing
-                points = self._smooth_points(points)
-            
-            if len(points) > 1:
-                draw.line(points, fill="black", width=2, joint="curve")
+        # Apply scaling and offset
+        points = (points - (min_x, min_y)) * scale + (start_x, start_y)
+        
+        # Apply smoothing
+        points, bounds = self._smooth_points(points, bounds)
+        
+        flat = points.ravel().tolist()
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            if end - start > 1:
+                draw.line(flat[2 * start:2 * end], fill="black", width=2, joint="curve")
 
-    def _smooth_points(self, points: List[Tuple[float, float]], iterations: int = 1) -> List[Tuple[float, float]]:
+    def _smooth_points(self, points: np.ndarray, bounds: np.ndarray, iterations: int = 1) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Applies Chaikin's algorithm to smooth the stroke.
+        Applies Chaikin's algorithm to every stroke of a packed line with more
+        than two points. Returns the new points and stroke bounds.
         """
-        if len(points) < 3: return points
-        
         for _ in range(iterations):
-            new_points = [points[0]]
-            for i in range(len(points) - 1):
-                p0 = points[i]
-                p1 = points[i+1]
-                
-                # Q = 0.75 P0 + 0.25 P1
-                Qx = 0.75 * p0[0] + 0.25 * p1[0]
-                Qy = 0.75 * p0[1] + 0.25 * p1[1]
-                
-                # R = 0.25 P0 + 0.75 P1
-                Rx = 0.25 * p0[0] + 0.75 * p1[0]
-                Ry = 0.25 * p0[1] + 0.75 * p1[1]
-                
-                new_points.append((Qx, Qy))
-                new_points.append((Rx, Ry))
+            lengths = np.diff(bounds)
+            smooth = lengths > 2
+            if not smooth.any():
+                break
+            
+            # A smoothed stroke of n points becomes 2n: first, (Q, R) per segment, last
+            new_lengths = np.where(smooth, 2 * lengths, lengths)
+            new_bounds = np.zeros_like(bounds)
+            np.cumsum(new_lengths, out=new_bounds[1:])
+            out = np.empty((new_bounds[-1], 2))
+            
+            stroke = np.repeat(np.arange(len(lengths)), lengths) # stroke of each point
+            local = np.arange(len(points)) - bounds[stroke] # index within the stroke
+            
+            kept = ~smooth[stroke]
+            out[new_bounds[stroke[kept]] + local[kept]] = points[kept]
+            
+            firsts, lasts = bounds[:-1][smooth], bounds[1:][smooth] - 1
+            out[new_bounds[:-1][smooth]] = points[firsts]
+            out[new_bounds[1:][smooth] - 1] = points[lasts]
+            
+            # Segments j -> j+1 inside smoothed strokes
+            segment = smooth[stroke[:-1]] & (stroke[:-1] == stroke[1:])
+            p0, p1 = points[:-1][segment], points[1:][segment]
+            at = new_bounds[stroke[:-1][segment]] + 1 + 2 * local[:-1][segment]
+            out[at] = 0.75 * p0 + 0.25 * p1 # Q = 0.75 P0 + 0.25 P1
+            out[at + 1] = 0.25 * p0 + 0.75 * p1 # R = 0.25 P0 + 0.75 P1
             
-            new_points.append(points[-1])
-            points = new_points
+            points, bounds = out, new_bounds
             
-        return points
+        return points, bounds
@@ -0,0 +1,137 @@
+import os
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+
+from renderer.font_renderer import FontRenderer, resolve_ink_color
+
+_register_lock = threading.Lock()
+
+def register_font(path: str) -> str:
+    """
+    Registers a TrueType font with ReportLab once per process and returns its
+    name. ReportLab embeds TTFs as subsets of the glyphs actually used.
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    name = "InkNotes-" + os.path.splitext(os.path.basename(path))[0]
+    with _register_lock:
+        if name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(name, path, subfontIndex=0))
+    return name
+
+class VectorPdfWriter:
+    """
+    Writes pages laid out by FontRenderer.layout() as PDF text in the embedded
+    handwriting font, instead of as page images. Each glyph gets its own text
+    matrix carrying the jitter the raster path draws: rotation plus line slope,
+    baseline offset and kerning. Opacity becomes fill alpha. Paper rules are
+    drawn as vector lines.
+
+    `dpi` is the resolution the renderer's pixel geometry stands for, so a
+    renderer at MASTER_SCALE and PRINT_DPI gives the same page size as the
+    raster PDF.
+    """
+    def __init__(self, renderer: FontRenderer, output_pdf_path: str, dpi: float):
+        from reportlab.pdfgen import canvas
+
+        self.renderer = renderer
+        self.output_pdf_path = output_pdf_path
+        self.k = 72.0 / dpi # points per renderer pixel
+        self.page_size = (renderer.width * self.k, renderer.height * self.k)
+        self.canvas = canvas.Canvas(output_pdf_path, pagesize=self.page_size, pageCompression=1)
+        self._advances: Dict[Tuple[str, str], float] = {}
+
+    def add_page(self, lines: np.ndarray, glyphs: np.ndarray, style: str = "default",
+                 color: str = "blue", paper: str = "blank") -> None:
+        if style not in self.renderer.fonts:
+            style = "default"
+        if not self.renderer.font_paths.get(style):
+            raise ValueError(f"Vector output needs a TrueType font, none found in {self.renderer.font_dir}")
+
+        self._draw_paper(paper)
+        if len(lines):
+            self._draw_text(lines, glyphs, style, color)
+        self.canvas.showPage()
+
+    def save(self) -> None:
+        self.canvas.save()
+        print(f"PDF saved to {self.output_pdf_path}")
+
+    def _draw_paper(self, paper: str) -> None:
+        r, k, c = self.renderer, self.k, self.canvas
+        width, height = self.page_size
+
+        if paper == "dark":
+            c.setFillColorRGB(30 / 255, 30 / 255, 30 / 255)
+            c.rect(0, 0, width, height, stroke=0, fill=1)
+
+        c.setLineWidth(max(1, r._px(1)) * k)
+        if paper == "line":
+            c.setStrokeColorRGB(1, 100 / 255, 100 / 255)
+            margin_x = (r.margin_left + r._px(10)) * k
+            c.line(margin_x, 0, margin_x, height)
+            c.setStrokeColorRGB(200 / 255, 200 / 255, 1)
+            c.lines([(0, height - y * k, width, height - y * k)
+                     for y in range(r.margin_top, r.height, r.line_spacing)])
+
+        elif paper == "grid":
+            c.setStrokeColorRGB(230 / 255, 230 / 255, 230 / 255)
+            c.lines([(x * k, 0, x * k, height) for x in range(0, r.width, r.line_spacing)] +
+                    [(0, height - y * k, width, height - y * k) for y in range(0, r.height, r.line_spacing)])
+
+    def _draw_text(self, lines: np.ndarray, glyphs: np.ndarray, style: str, color: str) -> None:
+        r, k = self.renderer, self.k
+        font = r.fonts[style]
+        ascent, descent = font.getmetrics()
+
+        # Glyph anchors ("mm", as in _get_glyph) in page pixels, then PDF points (y up)
+        counts = (lines["end"] - lines["start"]).astype(np.intp)
+        line_of = np.repeat(np.arange(len(lines)), counts)
+        anchor_x = (r.margin_left + lines["x_drift"][line_of] + glyphs["x"]) * k
+        anchor_y = self.page_size[1] - (lines["y"][line_of] + glyphs["y"]).astype(np.float64) * k
+
+        # Line slope: rotate each line about the middle of its glyphs, as the raster path does with its ink box
+        starts = lines["start"].astype(np.intp)
+        center_x = ((anchor_x[starts] + anchor_x[starts + counts - 1]) / 2)[line_of]
+        center_y = (np.add.reduceat(anchor_y, starts) / counts)[line_of]
+        line_angle = np.radians(lines["angle"].astype(np.float64))[line_of]
+        dx, dy = anchor_x - center_x, anchor_y - center_y
+        anchor_x = center_x + dx * np.cos(line_angle) - dy * np.sin(line_angle)
+        anchor_y = center_y + dx * np.sin(line_angle) + dy * np.cos(line_angle)
+
+        # Text origin is the left end of the baseline; move it from the anchor in the glyph's rotated frame
+        angle = line_angle + np.radians(glyphs["angle"] * r.GLYPH_ANGLE_STEP)
+        cos, sin = np.cos(angle), np.sin(angle)
+        chars = [chr(code) for code in glyphs["char"].tolist()]
+        offset_x = np.fromiter((self._advance(style, char) for char in chars), dtype=np.float64, count=len(chars)) * (-k / 2)
+        offset_y = -(ascent - descent) / 2 * k
+        origin_x = anchor_x + offset_x * cos - offset_y * sin
+        origin_y = anchor_y + offset_x * sin + offset_y * cos
+
+        # The raster path clips at the line canvas; glyphs anchored past it are not drawn
+        visible = (glyphs["x"] < r.width - r.margin_left * 2).tolist()
+
+        text = self.canvas.beginText()
+        text.setFont(register_font(r.font_paths[style]), font.size * k)
+        text.setFillColorRGB(*(channel / 255 for channel in resolve_ink_color(color)))
+        alpha = None
+        for char, shown, opacity, c, s, x, y in zip(chars, visible, glyphs["opacity"].tolist(), cos.tolist(),
+                                                    sin.tolist(), origin_x.tolist(), origin_y.tolist()):
+            if not shown or char.isspace():
+                continue
+            if opacity != alpha:
+                text.setFillAlpha(opacity / 255)
+                alpha = opacity
+            text.setTextTransform(c, s, -s, c, x, y)
+            text.textOut(char)
+        self.canvas.drawText(text)
+
+    def _advance(self, style: str, char: str) -> float:
+        key = (style, char)
+        advance = self._advances.get(key)
+        if advance is None:
+            advance = self._advances[key] = self.renderer.fonts[style].getlength(char)
+        return advance
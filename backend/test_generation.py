@@ -4,26 +4,34 @@ import os
 # Add backend to sys.path
 sys.path.append(os.path.dirname(__file__))
 
+from handwriting_model.stroke_store import get_stroke_store
 from handwriting_model.wrapper import HandwritingModel
 from renderer.stroke_renderer import StrokeRenderer
 
 def test_generation():
-    print("Initializing model...")
-    try:
-        model = HandwritingModel()
-    except Exception as e:
-        print(f"Failed to load model: {e}")
-        return
-
     text = "Hello, this is a test of InkNotes!"
-    print(f"Generating strokes for: '{text}'")
     
-    try:
-        strokes = model.generate_strokes(text, bias=0.8)
-        print(f"Generated {len(strokes)} strokes.")
-    except Exception as e:
-        print(f"Failed to generate strokes: {e}")
-        return
+    # A pre-generated store (INKNOTES_STROKE_STORE) is used when it covers the text
+    store = get_stroke_store()
+    strokes = store.line_strokes(text) if store is not None else None
+    if strokes is not None:
+        print(f"Loaded {len(strokes)} strokes from {store.path}.")
+    else:
+        print("Initializing model...")
+        try:
+            model = HandwritingModel()
+        except Exception as e:
+            print(f"Failed to load model: {e}")
+            return
+
+        print(f"Generating strokes for: '{text}'")
+        
+        try:
+            strokes = model.generate_strokes(text, bias=0.8)
+            print(f"Generated {len(strokes)} strokes.")
+        except Exception as e:
+            print(f"Failed to generate strokes: {e}")
+            return
 
     print("Initializing renderer...")
     renderer = StrokeRenderer()
@@ -0,0 +1,234 @@
+import sys
+import os
+import time
+
+# Add backend to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "backend")))
+
+from renderer.font_renderer import FontRenderer
+from pipeline.profiles import MASTER_SCALE, PRINT_DPI, write_page_profiles
+from pipeline.layout import TextLayout
+from pdf_tools.linebreak import break_lines
+
+SAMPLE_LINE = "The quick brown fox jumps over the lazy dog, again and again."
+
+def timed(fn, repeat=3):
+    """Returns the best wall time of fn() over `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def bench_recolor(page_text):
+    print("FontRenderer: full render vs. recolor of a cached ink mask")
+    fr = FontRenderer(background_type="line")
+    mask = fr.render_ink_mask(page_text)
+    
+    full_ms = timed(lambda: fr.render_to_image(page_text, color_override="red", paper_override="grid"))
+    recolor_ms = timed(lambda: fr.colorize(mask, "red", "grid"))
+    print(f"  - full render:   {full_ms:8.1f} ms/page")
+    print(f"  - recolor only:  {recolor_ms:8.1f} ms/page ({full_ms / recolor_ms:.0f}x faster)")
+
+def bench_line_compositing(page_text):
+    print("\nFontRenderer: per-character compositing vs. line-level fast path")
+    legacy = FontRenderer(fast_path=False)
+    fast = FontRenderer(fast_path=True)
+    fast.render_ink_mask(page_text) # warm the glyph cache, as a long-lived renderer would be
+    
+    legacy_ms = timed(lambda: legacy.render_ink_mask(page_text))
+    fast_ms = timed(lambda: fast.render_ink_mask(page_text))
+    print(f"  - per-character: {legacy_ms:8.1f} ms/page")
+    print(f"  - line-level:    {fast_ms:8.1f} ms/page ({legacy_ms / fast_ms:.1f}x faster)")
+
+def bench_profiles(page_text, tmp_dir="/tmp"):
+    print("\nOutput profiles: one print-resolution master, each profile downscaled from the next larger one")
+    master = FontRenderer(scale=MASTER_SCALE)
+    img = master.render_to_image(page_text)
+    prefix = os.path.join(tmp_dir, "inknote_bench_page")
+    
+    render_ms = timed(lambda: master.render_to_image(page_text))
+    encode_ms = timed(lambda: write_page_profiles(img, prefix))
+    for path in write_page_profiles(img, prefix).values():
+        print(f"  - {os.path.basename(path)}: {os.path.getsize(path) / 1024:.0f} KiB")
+        os.remove(path)
+    print(f"  - master render: {render_ms:8.1f} ms/page")
+    print(f"  - all profiles:  {encode_ms:8.1f} ms/page")
+
+def bench_layout_memory(pages=1000, lines_per_page=25):
+    import tracemalloc
+    print(f"\nText layout memory for a {pages}-page document")
+    make_lines = lambda: (f"{i:06d} {SAMPLE_LINE}" for i in range(pages * lines_per_page))
+    
+    # Before: a list of line strings plus a list of joined page strings
+    tracemalloc.start()
+    lines = list(make_lines())
+    page_texts = ["\n".join(lines[i:i + lines_per_page]) for i in range(0, len(lines), lines_per_page)]
+    lists_bytes = tracemalloc.get_traced_memory()[0]
+    del lines, page_texts
+    tracemalloc.stop()
+    
+    tracemalloc.start()
+    layout = TextLayout.from_lines(make_lines(), lines_per_page)
+    layout_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    print(f"  - line + page string lists: {lists_bytes / 1024:8.0f} KiB")
+    print(f"  - TextLayout:               {layout_bytes / 1024:8.0f} KiB (nbytes() = {layout.nbytes() / 1024:.0f} KiB)")
+
+def bench_linebreak(words=200000):
+    print(f"\nFallback line breaking of one {words}-word paragraph")
+    paragraph = " ".join((SAMPLE_LINE.split() * (words // 12 + 1))[:words])
+    
+    def slice_chunk(text, chunk_size=50):
+        # Before: rfind within a slice, then re-slice the remainder (quadratic)
+        lines = []
+        while len(text) > chunk_size:
+            split_idx = text[:chunk_size].rfind(' ')
+            if split_idx == -1: split_idx = chunk_size
+            lines.append(text[:split_idx])
+            text = text[split_idx:].strip()
+        return lines
+    
+    fr = FontRenderer()
+    char_width = lambda c: fr.measure_char(c)
+    slice_ms = timed(lambda: slice_chunk(paragraph), repeat=1)
+    chars_ms = timed(lambda: sum(1 for _ in break_lines(paragraph, 50)), repeat=1)
+    font_ms = timed(lambda: sum(1 for _ in break_lines(paragraph, fr.content_width, char_width)), repeat=1)
+    print(f"  - slice and rfind:       {slice_ms:8.1f} ms")
+    print(f"  - streaming, char count: {chars_ms:8.1f} ms")
+    print(f"  - streaming, font width: {font_ms:8.1f} ms")
+
+def bench_vector_pdf(page_text, pages=20, tmp_dir="/tmp"):
+    from pdf_tools.builder import create_pdf_from_jpegs
+    from pipeline.profiles import MASTER_PROFILE
+    from renderer.vector_renderer import VectorPdfWriter
+    print(f"\nPDF output for {pages} pages: print-resolution page images vs. vector text")
+    master = FontRenderer(scale=MASTER_SCALE)
+    if not master.font_paths["default"]:
+        print("  - skipped: vector output needs the TTF fonts in backend/assets/fonts")
+        return
+    raster_pdf = os.path.join(tmp_dir, "inknote_bench_raster.pdf")
+    vector_pdf = os.path.join(tmp_dir, "inknote_bench_vector.pdf")
+    written = []
+    
+    def raster():
+        # Before: render, encode every output profile, embed the print JPEGs
+        written.clear()
+        for i in range(pages):
+            img = master.render_to_image(page_text, paper_override="line")
+            written.append(write_page_profiles(img, os.path.join(tmp_dir, f"inknote_bench_page_{i}")))
+        create_pdf_from_jpegs([paths[MASTER_PROFILE] for paths in written], raster_pdf, dpi=PRINT_DPI)
+    
+    def vector():
+        writer = VectorPdfWriter(master, vector_pdf, dpi=PRINT_DPI)
+        for _ in range(pages):
+            lines, glyphs = master.layout(page_text)
+            writer.add_page(lines, glyphs, paper="line")
+        writer.save()
+    
+    raster_ms = timed(raster, repeat=1)
+    vector_ms = timed(vector, repeat=1)
+    print(f"  - raster: {raster_ms / pages:8.1f} ms/page, {os.path.getsize(raster_pdf) / 1024:8.0f} KiB")
+    print(f"  - vector: {vector_ms / pages:8.1f} ms/page, {os.path.getsize(vector_pdf) / 1024:8.0f} KiB")
+    for path in [raster_pdf, vector_pdf] + [p for paths in written for p in paths.values()]:
+        os.remove(path)
+
+def bench_stroke_store(words=20000, tmp_dir="/tmp"):
+    import pickle
+    import tracemalloc
+    import numpy as np
+    from handwriting_model.stroke_store import StrokeStore, write_stroke_store
+    from renderer.stroke_renderer import StrokeRenderer
+    print(f"\nPre-generated strokes for {words} words: pickled dict vs. memory-mapped store")
+    rng = np.random.default_rng(0)
+    keys = sorted((f"word{i}" for i in range(words)), key=lambda k: k.encode("utf-8"))
+    vocabulary = {key: [[[tuple(p) for p in np.cumsum(rng.normal(0, 3, (20, 2)), axis=0).tolist()]
+                         for _ in range(8)]] for key in keys}
+    pickle_path = os.path.join(tmp_dir, "inknote_bench_strokes.pkl")
+    store_path = os.path.join(tmp_dir, "inknote_bench.strokes")
+    with open(pickle_path, "wb") as f:
+        pickle.dump(vocabulary, f)
+    write_stroke_store(store_path, ((key, vocabulary[key]) for key in keys))
+    del vocabulary
+    
+    # What each worker process pays to have the vocabulary available
+    def load_pickle():
+        with open(pickle_path, "rb") as f:
+            return pickle.load(f)
+    tracemalloc.start()
+    loaded = load_pickle()
+    pickle_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    store = StrokeStore(store_path)
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    line = keys[:12]
+    renderer = StrokeRenderer()
+    draw_lists = timed(lambda: renderer.render_to_image([(loaded[k][0], 80 + 40 * i) for i, k in enumerate(line)]))
+    draw_store = timed(lambda: renderer.render_to_image([(store.get(k), 80 + 40 * i) for i, k in enumerate(line)]))
+    print(f"  - pickled dict: load {timed(load_pickle, repeat=1):7.1f} ms, {pickle_bytes / 2**20:6.1f} MiB private per process")
+    print(f"  - stroke store: open {timed(lambda: StrokeStore(store_path)):7.1f} ms, {store_bytes / 2**20:6.1f} MiB private per process "
+          f"({os.path.getsize(store_path) / 2**20:.1f} MiB shared mapping)")
+    print(f"  - 12-line page from lists: {draw_lists:6.1f} ms, from store views: {draw_store:6.1f} ms")
+    del store, loaded
+    os.remove(pickle_path)
+    os.remove(store_path)
+
+def make_scanned_pdf(path, pages=100, dpi=200):
+    """A text-less PDF of noisy page images, like a photocopied handout."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    
+    rng = np.random.default_rng(0)
+    size = (int(8.5 * dpi), int(11 * dpi))
+    images = []
+    for i in range(pages):
+        img = Image.new("L", size, 225)
+        draw = ImageDraw.Draw(img)
+        for y in range(dpi, size[1] - dpi, dpi // 4):
+            draw.text((dpi, y), f"{i:03d} {SAMPLE_LINE}", fill=30)
+        noise = rng.integers(-25, 25, (size[1], size[0]), dtype=np.int16)
+        images.append(Image.fromarray(np.clip(np.asarray(img, dtype=np.int16) + noise, 0, 255).astype(np.uint8)))
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=dpi)
+
+def bench_ocr(pages=100, tmp_dir="/tmp"):
+    import shutil
+    print(f"\nOCR of a {pages}-page scanned PDF")
+    if not (shutil.which("tesseract") and shutil.which("pdftoppm")):
+        print("  - skipped: needs the tesseract and poppler (pdftoppm) binaries")
+        return
+    import pytesseract
+    from pdf2image import convert_from_path
+    from pdf_tools.ocr import OcrEngine
+    
+    path = os.path.join(tmp_dir, "inknote_bench_scan.pdf")
+    make_scanned_pdf(path, pages)
+    
+    # Before: every page at the default DPI up front, then one tesseract run per page, serially
+    serial_ms = timed(lambda: [pytesseract.image_to_string(img) for img in convert_from_path(path)], repeat=1)
+    # After: pages in parallel, as the upload pipeline runs them on the bulk workers
+    from concurrent.futures import ThreadPoolExecutor
+    from pipeline.scheduler import workers_from_env
+    engine = OcrEngine()
+    workers = workers_from_env()[1]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        engine_ms = timed(lambda: engine.ocr_pdf(path, executor), repeat=1)
+    os.remove(path)
+    mode = "tesserocr, persistent" if engine.persistent else "pytesseract, a process per page"
+    print(f"  - serial pytesseract: {serial_ms / 1000:8.1f} s ({serial_ms / pages:.0f} ms/page)")
+    print(f"  - OcrEngine ({workers} workers, {mode}): {engine_ms / 1000:8.1f} s ({engine_ms / pages:.0f} ms/page)")
+
+if __name__ == "__main__":
+    page_text = "\n".join([SAMPLE_LINE] * 25)
+    bench_recolor(page_text)
+    bench_line_compositing(page_text)
+    bench_profiles(page_text)
+    bench_layout_memory()
+    bench_linebreak()
+    bench_vector_pdf(page_text)
+    bench_stroke_store()
+    bench_ocr()
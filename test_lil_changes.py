@@ -1,5 +1,7 @@
 import sys
 import os
+import tempfile
+import numpy as np
 from PIL import Image
 
 # Add backend to sys.path
@@ -7,6 +9,17 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "backend
 
 from renderer.font_renderer import FontRenderer
 from renderer.stroke_renderer import StrokeRenderer
+from handwriting_model.stroke_store import StrokeStore, write_stroke_store
+
+failures = []
+
+def check(ok, message):
+    """Prints one behaviour check; failures also make the script exit non-zero."""
+    if ok:
+        print(f"  - {message}")
+    else:
+        print(f"  - Error: NOT {message}")
+        failures.append(message)
 
 def test_lil_changes():
     print("Testing FontRenderer new features...")
@@ -43,5 +56,154 @@ def test_lil_changes():
     else:
         print("  - Error: render_to_image (StrokeRenderer) did NOT return a PIL Image.")
 
+    print("\nTesting stroke store round trip...")
+    entries = [
+        ("hello", [mock_strokes[0], mock_strokes[1]]), # two samples
+        ("world", [[[(0, 0), (5, 8)], [(5, 8)], []]]), # single-point and empty strokes
+        ("ünïcode", [[]]), # a sample with no strokes
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "words.strokes")
+        write_stroke_store(path, entries, bias=0.8)
+        store = StrokeStore(path)
+        
+        ok = len(store) == 3 and abs(store.bias - 0.8) < 1e-6 and "missing" not in store
+        for key, samples in entries:
+            stored = store.samples(key)
+            ok = ok and len(stored) == len(samples) and all(
+                len(a) == len(b) and all(np.array_equal(np.asarray(s, dtype=np.float32).reshape(-1, 2), t)
+                                         for s, t in zip(a, b))
+                for a, b in zip(samples, stored))
+        ok = ok and store.get("missing") is None and len(store.get("hello", variant=1)) == 1
+        
+        line = store.line_strokes("hello world")
+        ok = ok and line is not None and len(line) == 3 and store.line_strokes("hello there") is None
+        print("  - Stroke store round trip matches." if ok else "  - Error: stroke store round trip does NOT match.")
+        
+        # Rewriting a store that is mapped must leave the open one readable
+        write_stroke_store(path, entries[:1])
+        if len(StrokeStore(path)) == 1 and len(store.samples("world")) == 1 and not os.path.exists(path + ".tmp"):
+            print("  - Rewrite replaced the store without touching the mapped one.")
+        else:
+            print("  - Error: rewrite did NOT replace the store atomically.")
+        
+        if isinstance(sr.render_to_image([(line, 100)]), Image.Image):
+            print("  - StrokeRenderer rendered a line from the store.")
+        del store
+
+def test_text_layout():
+    from pipeline.layout import TextLayout
+    from pipeline.convert import job_renderer
+    
+    print("\nTesting TextLayout pagination...")
+    lines = [f"line {i}" for i in range(23)]
+    layout = TextLayout.from_lines(iter(lines), lines_per_page=10) # generators are fine
+    check(layout.page_count == 3 and layout.line_count == 23, "23 lines make 3 pages of up to 10")
+    check(layout.page_text(0) == "\n".join(lines[:10]) and layout.page_text(2) == "\n".join(lines[20:]),
+          "page_text is the page's lines joined by newlines")
+    check([layout.line(i) for i in layout.page_lines(1)] == lines[10:20], "page_lines/line give back the input")
+    check(TextLayout.from_lines([]).page_count == 0, "no lines make no pages")
+    check(TextLayout.from_lines(["", "", "x"], 2).page_text(0) == "\n", "blank lines are kept")
+    
+    # Every line of a job must be drawn: a page may not hold more than the renderer fits
+    for size in (12, 28, 36, 48, 72):
+        renderer = job_renderer(size)
+        layout = TextLayout.from_lines((f"line {i}" for i in range(200)), renderer.lines_per_page)
+        drawn = sum(len(renderer.layout(page)[0]) for page in layout.pages())
+        check(drawn == 200, f"all 200 lines are laid out at size {size} ({layout.page_count} pages)")
+
+def test_scheduler():
+    import threading
+    from pipeline.scheduler import QueueFull, Scheduler
+    
+    print("\nTesting bulk scheduling and admission...")
+    scheduler = Scheduler(preview_workers=1, bulk_workers=1, max_bulk_jobs=3, max_user_jobs=2)
+    gate = threading.Event()
+    order = []
+    scheduler.submit_bulk("gate", gate.wait)
+    futures = [scheduler.submit_bulk(user, order.append, f"{user}{i}")
+               for user, count in (("a", 3), ("b", 2)) for i in range(count)]
+    gate.set()
+    for future in futures:
+        future.result(timeout=10)
+    check(order == ["a0", "b0", "a1", "b1", "a2"], f"users take turns task by task ({order})")
+    
+    def admitted(user, jobs=1):
+        try:
+            scheduler.admit_bulk(user, jobs)
+            return True
+        except QueueFull:
+            return False
+    
+    check(admitted("a") and admitted("a") and not admitted("a"), "a user is refused past their own job limit")
+    check(admitted("b") and not admitted("c"), "everyone is refused past the process-wide job limit")
+    scheduler.release_bulk("a", 2)
+    scheduler.release_bulk("b")
+    check(admitted("c", 5), "a request larger than a limit is admitted when nothing else is")
+    check(not admitted("d"), "...and holds its jobs until they are released")
+    scheduler.release_bulk("c", 5)
+    check(admitted("d"), "released jobs make room again")
+
+def test_line_breaker():
+    from pdf_tools.linebreak import break_lines, is_heading
+    from pdf_tools.extractor import split_text_into_chunks
+    
+    print("\nTesting line breaking...")
+    for line in ("Chapter 3", "Section 2.1 Methods", "Part II: Review", "2.1 Background", "# Notes", "KEY TERMS"):
+        check(is_heading(line), f"{line!r} is a heading")
+    for line in ("Part of the reason is cost.", "Unit tests are useful here", "Section 3 describes the method…",
+                 "1.5 times more than before", "Chapter 3 covers this in depth."):
+        check(not is_heading(line), f"{line!r} is body text")
+    
+    text = "Results improved in most cases and\nPart of the reason is cost.\nThe experiment was run twice."
+    lines = list(break_lines(text, 40))
+    check("" not in lines and all(len(line) <= 40 for line in lines),
+          f"a body line that looks like a heading stays in its paragraph ({lines})")
+    check(" ".join(lines) == text.replace("\n", " "), "reflowing keeps every word in order")
+    
+    lines = list(break_lines("INTRO\nSome text here.\n\nMore text after a blank line.", 80))
+    check(lines == ["INTRO", "", "Some text here.", "", "More text after a blank line."],
+          f"headings and blank lines separate blocks ({lines})")
+    lines = list(break_lines("- first item that is long enough to wrap around", 20))
+    check(lines[0].startswith("- ") and all(line.startswith("  ") for line in lines[1:]),
+          f"wrapped bullet lines get a hanging indent ({lines})")
+    check(list(break_lines("an exam-\nple of this", 80)) == ["an example of this"], "words hyphenated across lines are rejoined")
+    lines = list(break_lines("a" * 25, 10))
+    check(all(len(line) <= 10 for line in lines) and "".join(lines).replace("-", "") == "a" * 25,
+          f"words wider than a line are hyphenated ({lines})")
+    
+    paragraphs = ["word " * 20, "", "text " * 20, "", "more " * 20]
+    chunks = split_text_into_chunks("\n".join(paragraphs), max_chars_per_page=250)
+    check("".join(chunks) == "\n".join(paragraphs) + "\n", "chunks add up to the text")
+    check(len(chunks) == 2 and chunks[1].startswith("more"), "a chunk ends before the paragraph that would overflow it")
+    chunks = split_text_into_chunks("\n".join(["x" * 30] * 10), max_chars_per_page=100)
+    check(all(len(chunk) <= 100 for chunk in chunks), "a paragraph longer than a page is split between lines")
+
+def test_ocr_preprocess():
+    from PIL import ImageDraw
+    from pdf_tools.ocr import preprocess_page
+    
+    print("\nTesting OCR blank-page detection...")
+    rng = np.random.default_rng(0)
+    def scan(paper, ink=None, noise=0):
+        img = Image.new("L", (850, 1100), paper)
+        if ink is not None:
+            draw = ImageDraw.Draw(img)
+            for y in range(100, 1000, 25):
+                draw.text((100, y), "The quick brown fox jumps over the lazy dog " * 2, fill=ink)
+        pixels = np.asarray(img, dtype=np.int16) + rng.integers(-noise, noise + 1, (1100, 850))
+        return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    
+    check(preprocess_page(scan(245, ink=150)) is not None, "faded text (150 on 245) is not blank")
+    check(preprocess_page(scan(225, ink=30, noise=25)) is not None, "a noisy photocopy is not blank")
+    check(preprocess_page(scan(225, noise=25)) is None, "noisy paper with no text is blank")
+    check(preprocess_page(scan(245)) is None, "clean paper is blank")
+
 if __name__ == "__main__":
     test_lil_changes()
+    test_text_layout()
+    test_scheduler()
+    test_line_breaker()
+    test_ocr_preprocess()
+    if failures:
+        sys.exit(f"{len(failures)} check(s) failed")